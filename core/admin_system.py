@@ -1,18 +1,47 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
-from core.config_loader import DBH, TEXTS, reload_config, reload_texts, reload_dns_list
-from core.utils import check_user, is_admin, is_owner, now_ts, fmt_ts, human_ago
-
-# Admin panel settings:
-ADMIN_PANEL = {
-    "notify_new_user": True,
-    "notify_new_config": True
-}
+from core.config_loader import ADB, TEXTS, reload_config, reload_texts, reload_dns_list
+from core.utils import check_user, is_admin, is_owner, now_ts, fmt_ts, human_ago, encode_cursor, decode_cursor
+from core.token_cache import TOKEN_CACHE
+from core.broadcast import BROADCASTS
+from core.notifier import ADMIN_PANEL, save_admin_panel
+from core.inflight import INFLIGHT
+from core.markup_cache import MARKUPS
+from core.metrics import LOOP_LAG, latency_summary, counter_total
+from core.circuit_breaker import RADARGAME_BREAKER
+from core.flood_guard import FLOOD_GUARD
+from core.cache_bus import CACHE_BUS
+
 PAGE_SIZE = 20
 
+### --- Latency summary for the status panel --- ###
+def status_latency_text() -> str:
+    line = TEXTS["admin"]["status_latency_line"]
+    sections = []
+    for title_key, family, label, limit in (("status_latency_handlers", "bot_handler_seconds", "handler", 3),
+                                            ("status_latency_api", "radargame_api_seconds", "endpoint", 3),
+                                            ("status_latency_db", "bot_db_query_seconds", "method", 3)):
+        rows = latency_summary(family, label, limit)
+        if not rows:
+            continue
+        lines = [TEXTS["admin"][title_key]]
+        for name, count, p50, p99 in rows:
+            text = line.format(name=name, count=count, p50=round(p50), p99=round(p99))
+            if family == "radargame_api_seconds":
+                failed = counter_total("radargame_api_requests_total", endpoint=name) - counter_total("radargame_api_requests_total", endpoint=name, outcome="ok")
+                text += TEXTS["admin"]["status_latency_failed"].format(failed=int(failed))
+            lines.append(text)
+        sections.append("\n".join(lines))
+    sections.append(TEXTS["admin"]["status_loop_lag"].format(p99=round(LOOP_LAG.histogram.quantile(0.99) * 1000)))
+    return "\n".join(sections)
+
 ### ---------------------------- Admin Panel ---------------------------- ###
 def admin_panel_keyboard():
+    # one variant per notification toggle state
+    return MARKUPS.get(("admin_panel", ADMIN_PANEL["notify_new_user"], ADMIN_PANEL["notify_new_config"]), build_admin_panel_keyboard)
+
+def build_admin_panel_keyboard():
     rows = [
         [
             InlineKeyboardButton(
@@ -42,13 +71,18 @@ def admin_panel_keyboard():
     return InlineKeyboardMarkup(rows)
 
 def admin_panel_text():
+    # the breaker state is part of the key, the text changes when it opens or closes
+    return MARKUPS.get(("admin_panel_text", ADMIN_PANEL["notify_new_user"], ADMIN_PANEL["notify_new_config"], RADARGAME_BREAKER.state), build_admin_panel_text)
+
+def build_admin_panel_text():
     return TEXTS["admin"]["panel_text"].format(user_notify_status='فعال ✅' if ADMIN_PANEL['notify_new_user'] else 'غیرفعال ❌', 
-                                                config_notify_status='فعال ✅' if ADMIN_PANEL['notify_new_config'] else 'غیرفعال ❌')
+                                                config_notify_status='فعال ✅' if ADMIN_PANEL['notify_new_config'] else 'غیرفعال ❌',
+                                                radargame_status=TEXTS["admin"]["breaker_states"][RADARGAME_BREAKER.state])
 
 async def adminpanel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_user(update, context, check_force_join=False):
         return
-    if not is_admin(update.effective_user.id):
+    if not await is_admin(update.effective_user.id):
         return
     await update.effective_chat.send_message(admin_panel_text(), reply_markup=admin_panel_keyboard(), parse_mode="HTML")
 
@@ -58,7 +92,7 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Check is owner
-    if not is_owner(update.effective_user.id):
+    if not await is_owner(update.effective_user.id):
         return
     
     # If not a reply, show usage help
@@ -70,53 +104,22 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     target = None
     if context.args:
         key = context.args[0]
-        user = DBH.find_user_by_any(key)
+        user = await ADB.find_user_by_any(key)
         if not user:
             await update.effective_chat.send_message(TEXTS["errors"]["user_notfound"], parse_mode="HTML")
             return
         target = user["user_id"]
 
-    # Get all target chat IDs
-    chat_ids = []
-    if target:
-        chat_ids = [target]
-    else:
-        with DBH._connect() as con:
-            cur = con.cursor()
-            # Add all active user IDs
-            user_ids = [row[0] for row in cur.execute(
-                "SELECT user_id FROM users WHERE banned=0"
-            ).fetchall()]
-        
-        # Merge lists and remove duplicates
-        chat_ids = list(set(user_ids))
-    
-    # Forward message
+    # Queue a resumable broadcast job, progress is reported by editing one status message
     message = update.message.reply_to_message
-    success = 0
-    failed = 0
-    for chat_id in chat_ids:
-        try:
-            await context.bot.copy_message(
-                chat_id=chat_id,
-                from_chat_id=message.chat_id,
-                message_id=message.message_id
-            )
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await update.effective_chat.send_message(
-        TEXTS["admin"]["broadcast"]["result"].format(success=success, failed=failed),
-        parse_mode="HTML"
-    )
+    await BROADCASTS.create(context.bot, update.effective_user.id, message.chat_id, message.message_id, target, update.effective_chat.id)
 
 ### --- Admin view list of all users Command --- ###
-async def show_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1):
-    if not is_owner(update.effective_user.id):
+async def show_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1, after: tuple | None = None, before: tuple | None = None):
+    if not await is_owner(update.effective_user.id):
         return
 
-    total = DBH.count_users()
+    total = await ADB.count_users()
     if total == 0:
         if update.callback_query:
             await update.callback_query.edit_message_text(TEXTS["errors"]["user_notfound"])
@@ -125,10 +128,12 @@ async def show_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE, pag
         return
 
     max_page = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    users = await ADB.get_users_keyset(PAGE_SIZE, after=after, before=before)
+    if not users:
+        # stale cursor (e.g. an old message), start over
+        page = 1
+        users = await ADB.get_users_keyset(PAGE_SIZE)
     page = max(1, min(page, max_page))
-    offset = (page - 1) * PAGE_SIZE
-
-    users = DBH.get_users_page(PAGE_SIZE, offset)
 
     message = (
         f"📊 تعداد کل کاربران: {total}\n"
@@ -136,11 +141,13 @@ async def show_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE, pag
         "\n".join([f"‎🔹<code>{u['user_id']}</code> - {u['full_name'] or 'بدون نام'}" for u in users])
     )
 
+    # the cursor is the sort key of the first / last row on this page
+    first, last = users[0], users[-1]
     buttons = []
     if page > 1:
-        buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"show_users:{page-1}"))
+        buttons.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"show_users:{page-1}:p:{encode_cursor(first['created_at'], first['user_id'])}"))
     if page < max_page:
-        buttons.append(InlineKeyboardButton("➡️ بعدی", callback_data=f"show_users:{page+1}"))
+        buttons.append(InlineKeyboardButton("➡️ بعدی", callback_data=f"show_users:{page+1}:n:{encode_cursor(last['created_at'], last['user_id'])}"))
 
     markup = InlineKeyboardMarkup([buttons]) if buttons else None
 
@@ -154,7 +161,7 @@ async def admin_userinfo(update: Update, context: ContextTypes.DEFAULT_TYPE, use
     if not await check_user(update, context, check_force_join=False):
         return
     # Check is admin or owner
-    if not is_admin(update.effective_user.id):
+    if not await is_admin(update.effective_user.id):
         return
     
     is_edit = update.callback_query is not None
@@ -170,7 +177,7 @@ async def admin_userinfo(update: Update, context: ContextTypes.DEFAULT_TYPE, use
     target_user_id = None
     if context.args:
         key = context.args[0]
-        row = DBH.find_user_by_any(key)
+        row = await ADB.find_user_by_any(key)
         if row:
             target_user_id = row["user_id"]
         else:
@@ -179,7 +186,7 @@ async def admin_userinfo(update: Update, context: ContextTypes.DEFAULT_TYPE, use
     elif is_edit:
         if user_id:
             target_user_id = user_id
-            row = DBH.get_user(target_user_id)
+            row = await ADB.get_user(target_user_id)
             if not row:
                 await update.effective_chat.send_message(TEXTS["errors"]["user_notfound"], parse_mode="HTML")
                 return
@@ -204,7 +211,7 @@ async def admin_userinfo(update: Update, context: ContextTypes.DEFAULT_TYPE, use
 # Generate userinfo text from user_id
 async def generate_userinfo_text(user_id: int) -> str:
     # Get user stats from DB
-    user_stats = DBH.stats_for_user(user_id)
+    user_stats = await ADB.stats_for_user(user_id)
     now = now_ts()
     text = TEXTS["admin"]["user_info"].format(
         user_id=user_id,
@@ -230,18 +237,36 @@ async def admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data or ""
     user_id = update.effective_user.id
 
-    if not is_admin(user_id):
+    if not await is_admin(user_id):
         await query.answer(TEXTS["errors"]["access_denied"], show_alert=True)
         return
     
     elif data.startswith("show_users:"):
-        page = int(data.split(":")[1])
-        await show_all_users(update, context, page=page)
+        # show_users:<page>[:n|p:<created_at>.<user_id>]
+        parts = data.split(":")
+        page = int(parts[1]) if parts[1].isdigit() else 1
+        cursor = decode_cursor(parts[3]) if len(parts) > 3 else None
+        if cursor and len(cursor) == 2:
+            await show_all_users(update, context, page=page, after=cursor if parts[2] == "n" else None, before=cursor if parts[2] == "p" else None)
+        else:
+            await show_all_users(update, context)
         return
     
+    elif data.startswith("bcast:"):
+        if not await is_owner(user_id):
+            await query.answer(TEXTS["errors"]["access_denied"], show_alert=True)
+            return
+        _, action, job_id = data.split(":")
+        handlers = {"pause": BROADCASTS.pause, "resume": BROADCASTS.resume, "cancel": BROADCASTS.cancel}
+        if action in handlers and await handlers[action](context.bot, int(job_id)):
+            await query.answer(TEXTS["admin"]["setting_saved"])
+        else:
+            await query.answer(TEXTS["errors"]["unexpected_error"], show_alert=True)
+        return
+
     elif data.startswith("admin_banuser:"):
         target_user_id = int(data.split(":")[1])
-        user = DBH.get_user(target_user_id)
+        user = await ADB.get_user(target_user_id)
 
         # Check ban yourself
         if user_id == target_user_id:
@@ -253,21 +278,24 @@ async def admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer(TEXTS["errors"]["user_notfound"], show_alert=True)
             return
         
-        DBH.set_ban(target_user_id, not user["banned"])
+        await ADB.set_ban(target_user_id, not user["banned"])
+        await CACHE_BUS.publish_user(target_user_id)
         await query.answer(TEXTS["admin"]["ban_state_changed"], show_alert=True)
         await admin_userinfo(update, context, target_user_id)
         return
     
     elif data.startswith("admin_removeall:"):
         target_user_id = int(data.split(":")[1])
-        user = DBH.get_user(target_user_id)
+        user = await ADB.get_user(target_user_id)
 
         # Check is user available
         if not user:
             await query.answer(TEXTS["errors"]["user_notfound"], show_alert=True)
             return
         
-        result = DBH.delete_all_radargame_accounts_for_user(target_user_id)
+        result = await ADB.delete_all_radargame_accounts_for_user(target_user_id)
+        TOKEN_CACHE.invalidate(target_user_id)
+        await CACHE_BUS.publish_user(target_user_id)
         if result > 0:
             await query.answer(TEXTS["admin"]["account_remove"]["result"].format(result=result), show_alert=True)
         else:
@@ -277,34 +305,36 @@ async def admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif data == "toggle_user_notify":
         ADMIN_PANEL["notify_new_user"] = not ADMIN_PANEL["notify_new_user"]
+        await save_admin_panel()
+        await CACHE_BUS.publish_admin_panel()
         await query.answer(TEXTS["admin"]["setting_saved"])
 
     elif data == "toggle_config_notify":
         ADMIN_PANEL["notify_new_config"] = not ADMIN_PANEL["notify_new_config"]
+        await save_admin_panel()
+        await CACHE_BUS.publish_admin_panel()
         await query.answer(TEXTS["admin"]["setting_saved"])
 
     elif data == "status_panel":
-        with DBH._connect() as conn:
-            cursor = conn.cursor()
-            total_users = cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-            total_radargame = cursor.execute("SELECT COUNT(*) FROM radargame").fetchone()[0]
-            banned_users = cursor.execute("SELECT COUNT(*) FROM users WHERE banned=1").fetchone()[0]
-            import datetime
-            today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_ts = int(today.timestamp())
-            today_active = cursor.execute("SELECT COUNT(*) FROM users WHERE last_active >= ?", (today_ts,)).fetchone()[0]
+        counts = await ADB.status_counts()
+        trend = "\n".join(TEXTS["admin"]["status_trend_line"].format(**day) for day in counts.pop("history")) or "-"
 
+        token_stats = TOKEN_CACHE.stats()
+        flood_stats = FLOOD_GUARD.stats()
         await query.edit_message_text(
-            TEXTS["admin"]["status_result"].format(total_users=total_users, total_radargame=total_radargame, banned_users=banned_users, today_active=today_active),
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton(TEXTS["admin"]["backtomenu"], callback_data="adminpanel")]
-            ]),
+            TEXTS["admin"]["status_result"].format(**counts, trend=trend,
+                                                   token_hits=token_stats["hits"], token_misses=token_stats["misses"], token_refreshes=token_stats["refreshes"],
+                                                   duplicates_suppressed=INFLIGHT.stats()["suppressed"],
+                                                   rate_limited=flood_stats["rejected"], abusers=flood_stats["abusers"],
+                                                   latency=status_latency_text()),
+            reply_markup=MARKUPS.get("back_to_admin", lambda: InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["admin"]["backtomenu"], callback_data="adminpanel")]])),
             parse_mode="HTML"
         )
         return
     
     elif data == "reload_config":
         if reload_config():
+            await CACHE_BUS.publish("reload", "config")
             await query.answer(TEXTS["admin"]["reload_config"]["success"])
         else:
             await query.answer(TEXTS["admin"]["reload_config"]["error"])
@@ -312,6 +342,7 @@ async def admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif data == "reload_texts":
         if reload_texts():
+            await CACHE_BUS.publish("reload", "texts")
             await query.answer(TEXTS["admin"]["reload_texts"]["success"])
         else:
             await query.answer(TEXTS["admin"]["reload_texts"]["error"])
@@ -319,6 +350,7 @@ async def admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif data == "reload_dnslist":
         if reload_dns_list():
+            await CACHE_BUS.publish("reload", "dns")
             await query.answer(TEXTS["admin"]["reload_dnslist"]["success"])
         else:
             await query.answer(TEXTS["admin"]["reload_dnslist"]["error"])
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from core.db import DB
+from core.metrics import METRICS
+
+# DB methods that modify data; they all go through the single writer thread
+WRITE_METHODS = frozenset({
+    "upsert_user",
+    "set_ban",
+    "add_radargame_account",
+    "set_radargame_token",
+    "set_active_radargame",
+    "delete_radargame_account",
+    "delete_all_radargame_accounts_for_user",
+    "apply_user_activity",
+    "set_blocked",
+    "create_broadcast_job",
+    "update_broadcast_job",
+    "claim_broadcast_job",
+    "set_broadcast_job_status",
+    "update_broadcast_progress",
+    "apply_persistence_changes",
+    "drop_persisted_data",
+    "add_invalidations",
+    "set_bot_settings",
+    "prune_invalidations",
+})
+
+def _timed(func, *args, **kwargs):
+    # runs on the DB thread; executor queueing is not part of the measurement
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+### --- Async facade over DB (keeps SQLite off the event loop) --- ###
+class AsyncDB:
+    def __init__(self, db: DB, readers: int = 4):
+        self.db = db
+        # one serialized write queue + a small reader pool, each thread keeps its own connection
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        # func(user_id, row) -> row with not yet written values (core/write_behind.py)
+        self._pending_overlay = lambda user_id, row: row
+        # DB handle -> calls submitted on it; a handle replaced by swap() is closed when it drops to 0
+        self._inflight = Counter()
+        self._retired = set()
+        self._inflight_lock = threading.Lock()
+
+    def set_pending_overlay(self, func):
+        self._pending_overlay = func
+
+    def _release(self, db, _future=None):
+        # runs when the call finished or was cancelled before it started, on any thread
+        with self._inflight_lock:
+            self._inflight[db] -= 1
+            if self._inflight[db] or db not in self._retired:
+                return
+            del self._inflight[db]
+            self._retired.discard(db)
+        db.close()
+
+    async def _run(self, executor, func, *args, **kwargs):
+        db = getattr(func, "__self__", None)
+        with self._inflight_lock:
+            self._inflight[db] += 1
+        future = executor.submit(functools.partial(_timed, func, *args, **kwargs))
+        future.add_done_callback(functools.partial(self._release, db))
+        result, elapsed = await asyncio.wrap_future(future)
+        METRICS.histogram("bot_db_query_seconds", "DB method time on its thread", method=func.__name__).observe(elapsed)
+        return result
+
+    async def read(self, func, *args, **kwargs):
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def write(self, func, *args, **kwargs):
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # ADB.<method>(...) -> awaitable DB.<method>(...) on the matching executor
+        attr = getattr(self.db, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        executor = self._writer if name in WRITE_METHODS else self._readers
+
+        async def method(*args, **kwargs):
+            return await self._run(executor, getattr(self.db, name), *args, **kwargs)
+        return method
+
+    async def get_user(self, user_id: int):
+        # cached rows never need a thread hop
+        row = self.db.user_cache.get(user_id)
+        if row is not None:
+            return row
+        row = await self.read(self.db.get_user, user_id)
+        merged = self._pending_overlay(user_id, row)
+        if merged is not row:
+            # reloaded after an eviction, the buffered values are not in the DB yet
+            self.cache_user_fields(user_id, usage_count=merged["usage_count"], last_active=merged["last_active"])
+        return merged
+
+    async def stats_for_user(self, user_id: int):
+        # profile / admin user info: the DB row plus buffered usage_count / last_active
+        return self._pending_overlay(user_id, await self.read(self.db.stats_for_user, user_id))
+
+    def cache_user_fields(self, user_id: int, **fields):
+        # memory-only update for values that are written later (see core/write_behind.py)
+        row = self.db.user_cache.get(user_id)
+        if row is not None:
+            self.db.user_cache.set(user_id, dict(row, **fields))
+
+    def cache_user_usage(self, user_id: int, count: int = 1):
+        row = self.db.user_cache.get(user_id)
+        if row is not None:
+            self.db.user_cache.set(user_id, dict(row, usage_count=(row["usage_count"] or 0) + count))
+
+    def forget_user(self, user_id: int):
+        # drop the cached row and account count, the next read goes to the DB
+        self.db.invalidate_user(user_id)
+
+    def swap(self, db: DB):
+        # used by reload_config; in-flight calls finish on the old handle, then it is closed
+        old, self.db = self.db, db
+        with self._inflight_lock:
+            if self._inflight[old]:
+                self._retired.add(old)
+                return
+            self._inflight.pop(old, None)
+        old.close()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.db.close()
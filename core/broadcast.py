@@ -0,0 +1,224 @@
+import asyncio
+import functools
+import itertools
+import os
+import time
+from datetime import timedelta
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+
+from core.config_loader import ADB, CFG, TEXTS
+from core.ratelimit import TokenBucket, KeyedTokenBuckets
+from core.cache_bus import CACHE_BUS
+from core.workers import local_share
+
+DEFAULT_BROADCAST = {
+    "concurrency": 20,
+    "global_rate": 25,       # messages per second for the whole bot (split between workers)
+    "per_chat_rate": 1,      # messages per second per chat
+    "batch_size": 100,
+    "progress_interval": 5,  # seconds between status message edits
+    "max_retries": 3
+}
+RUNNING, PAUSED, CANCELLED, DONE = "running", "paused", "cancelled", "done"
+SENT, FAILED, BLOCKED = "sent", "failed", "blocked"
+
+def broadcast_settings() -> dict:
+    settings = dict(DEFAULT_BROADCAST)
+    settings.update(CFG.get("BROADCAST", {}))
+    return settings
+
+### --- Status message --- ###
+def broadcast_status_text(job) -> str:
+    texts = TEXTS["admin"]["broadcast"]
+    if job["status"] == DONE:
+        return texts["result"].format(success=job["success"], failed=job["failed"] + job["blocked"])
+    return texts["progress"].format(
+        job_id=job["id"],
+        status=texts["status"][job["status"]],
+        success=job["success"],
+        failed=job["failed"],
+        blocked=job["blocked"],
+        done=job["success"] + job["failed"] + job["blocked"],
+        total=job["total"]
+    )
+
+def broadcast_status_keyboard(job):
+    buttons = TEXTS["admin"]["broadcast"]["buttons"]
+    if job["status"] == RUNNING:
+        row = [InlineKeyboardButton(buttons["pause"], callback_data=f"bcast:pause:{job['id']}")]
+    elif job["status"] == PAUSED:
+        row = [InlineKeyboardButton(buttons["resume"], callback_data=f"bcast:resume:{job['id']}")]
+    else:
+        return None
+    row.append(InlineKeyboardButton(buttons["cancel"], callback_data=f"bcast:cancel:{job['id']}"))
+    return InlineKeyboardMarkup([row])
+
+### --- Broadcast job engine --- ###
+# The job row is the source of truth: pause/resume/cancel may arrive on any worker,
+# they change status (or runner) in the DB and the sending task re-reads it per batch.
+class BroadcastEngine:
+    def __init__(self):
+        self._tasks = {}     # job_id -> asyncio.Task, removed when it ends
+        self._runs = itertools.count(1)
+        self.reset_buckets()
+
+    def reset_buckets(self):
+        # again once the worker count is known (main.on_startup)
+        settings = broadcast_settings()
+        self.global_bucket = TokenBucket(local_share(settings["global_rate"]))
+        self.chat_buckets = KeyedTokenBuckets(settings["per_chat_rate"], maxsize=10000)
+
+    async def create(self, bot, owner_id: int, from_chat_id: int, message_id: int, target_user_id: int | None, status_chat_id: int) -> int:
+        total = 1 if target_user_id else await ADB.count_broadcast_recipients()
+        job_id = await ADB.create_broadcast_job(owner_id, from_chat_id, message_id, target_user_id, total)
+        job = await ADB.get_broadcast_job(job_id)
+        status_message = await bot.send_message(status_chat_id, broadcast_status_text(job), reply_markup=broadcast_status_keyboard(job), parse_mode="HTML")
+        await ADB.update_broadcast_job(job_id, status_chat_id=status_chat_id, status_message_id=status_message.message_id)
+        await self._start(bot, job_id, (RUNNING,))
+        return job_id
+
+    async def _start(self, bot, job_id: int, from_statuses: tuple) -> bool:
+        # a fresh runner id per start; a task still finishing an older run sees it and stops
+        runner = f"{os.getpid()}-{next(self._runs)}"
+        previous = self._tasks.get(job_id)
+        if previous is not None:
+            # e.g. resume right after pause: the old run stores its current batch's cursor first,
+            # so the new one doesn't send that batch again
+            await asyncio.wait({previous})
+        if not await ADB.claim_broadcast_job(job_id, runner, from_statuses):
+            return False
+        task = self._tasks[job_id] = asyncio.create_task(self._run_guarded(bot, job_id, runner))
+        task.add_done_callback(functools.partial(self._task_done, job_id))
+        return True
+
+    def _task_done(self, job_id: int, task: asyncio.Task):
+        if self._tasks.get(job_id) is task:
+            del self._tasks[job_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Broadcast {job_id}: runner failed: {task.exception()}")
+
+    async def _run_guarded(self, bot, job_id: int, runner: str):
+        try:
+            await self._run(bot, job_id, runner)
+        except Exception as e:
+            # paused instead of left "running" without a sender; the admin can resume it from its cursor
+            print(f"Broadcast {job_id} paused after an error: {e}")
+            if await ADB.set_broadcast_job_status(job_id, PAUSED, (RUNNING,), runner=runner):
+                await self._edit_status(bot, await ADB.get_broadcast_job(job_id))
+
+    async def resume_pending(self, bot):
+        # jobs interrupted by a restart continue from their stored cursor (primary worker only)
+        for job in await ADB.get_broadcast_jobs_by_status(RUNNING):
+            await self._start(bot, job["id"], (RUNNING,))
+
+    async def pause(self, bot, job_id: int) -> bool:
+        return await self._set_status(bot, job_id, PAUSED, (RUNNING,))
+
+    async def resume(self, bot, job_id: int) -> bool:
+        job = await ADB.get_broadcast_job(job_id)
+        if not job or not await self._start(bot, job_id, (PAUSED,)):
+            return False
+        await self._edit_status(bot, dict(job, status=RUNNING))
+        return True
+
+    async def cancel(self, bot, job_id: int) -> bool:
+        return await self._set_status(bot, job_id, CANCELLED, (RUNNING, PAUSED))
+
+    async def _set_status(self, bot, job_id: int, status: str, from_statuses: tuple) -> bool:
+        # the sending task, on whichever worker, stops after its current batch
+        if not await ADB.set_broadcast_job_status(job_id, status, from_statuses):
+            return False
+        job = await ADB.get_broadcast_job(job_id)
+        await self._edit_status(bot, job)
+        return True
+
+    async def stop(self):
+        # leave jobs as "running" so resume_pending picks them up on the next start
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _edit_status(self, bot, job):
+        if not job["status_chat_id"] or not job["status_message_id"]:
+            return
+        try:
+            await bot.edit_message_text(broadcast_status_text(job), chat_id=job["status_chat_id"], message_id=job["status_message_id"],
+                                        reply_markup=broadcast_status_keyboard(job), parse_mode="HTML")
+        except BadRequest:
+            # "message is not modified" or the status message is gone
+            pass
+        except Exception as e:
+            print(f"Failed to update broadcast status: {e}")
+
+    async def _finish(self, bot, job, runner: str):
+        # a pause/cancel written meanwhile wins over "done"
+        if await ADB.set_broadcast_job_status(job["id"], DONE, (RUNNING,), runner=runner):
+            await self._edit_status(bot, dict(job, status=DONE))
+
+    async def _send(self, bot, job, chat_id: int, semaphore: asyncio.Semaphore) -> str:
+        settings = broadcast_settings()
+        async with semaphore:
+            for _ in range(settings["max_retries"]):
+                await self.chat_buckets.acquire(chat_id)
+                await self.global_bucket.acquire()
+                try:
+                    await bot.copy_message(chat_id=chat_id, from_chat_id=job["from_chat_id"], message_id=job["message_id"])
+                    return SENT
+                except RetryAfter as e:
+                    delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                    # flood control applies to the whole bot, hold every sender
+                    self.global_bucket.block(delay)
+                    await asyncio.sleep(delay)
+                except Forbidden:
+                    return BLOCKED
+                except BadRequest as e:
+                    return BLOCKED if "chat not found" in str(e).lower() else FAILED
+                except (TimedOut, NetworkError):
+                    await asyncio.sleep(1)
+                except Exception:
+                    return FAILED
+            return FAILED
+
+    async def _run(self, bot, job_id: int, runner: str):
+        settings = broadcast_settings()
+        semaphore = asyncio.Semaphore(settings["concurrency"])
+        last_edit = time.monotonic()
+
+        while True:
+            # paused, cancelled or resumed elsewhere: whoever changed it already updated the status message
+            job = await ADB.get_broadcast_job(job_id)
+            if not job or job["status"] != RUNNING or job["runner"] != runner:
+                return
+
+            if job["target_user_id"]:
+                batch = [job["target_user_id"]] if job["cursor"] == 0 else []
+            else:
+                batch = await ADB.get_broadcast_recipients(job["cursor"], settings["batch_size"])
+            if not batch:
+                await self._finish(bot, job, runner)
+                return
+
+            results = await asyncio.gather(*(self._send(bot, job, chat_id, semaphore) for chat_id in batch))
+            blocked_ids = [chat_id for chat_id, result in zip(batch, results) if result == BLOCKED]
+            if blocked_ids and not job["target_user_id"]:
+                await ADB.set_blocked(blocked_ids, True)
+                await CACHE_BUS.publish_user(*blocked_ids)
+
+            job = dict(job,
+                       cursor=batch[-1],
+                       success=job["success"] + results.count(SENT),
+                       failed=job["failed"] + results.count(FAILED),
+                       blocked=job["blocked"] + len(blocked_ids))
+            if not await ADB.update_broadcast_progress(job_id, runner, cursor=job["cursor"], success=job["success"], failed=job["failed"], blocked=job["blocked"]):
+                # resumed by another run while this batch was sending
+                return
+
+            if time.monotonic() - last_edit >= settings["progress_interval"]:
+                last_edit = time.monotonic()
+                await self._edit_status(bot, job)
+
+BROADCASTS = BroadcastEngine()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+
+from core.config_loader import ADB, CFG, reload_config, reload_texts, reload_dns_list
+from core.notifier import ADMIN_PANEL
+from core.token_cache import TOKEN_CACHE
+
+DEFAULT_CACHE_BUS = {
+    "poll_interval": 0.5,  # seconds between checks for other workers' invalidations
+    "retention": 3600      # seconds an invalidation row is kept
+}
+PRUNE_INTERVAL = 300
+RELOADS = {"config": reload_config, "texts": reload_texts, "dns": reload_dns_list}
+
+def cache_bus_settings() -> dict:
+    settings = dict(DEFAULT_CACHE_BUS)
+    settings.update(CFG.get("CACHE_BUS", {}))
+    return settings
+
+### --- Cross-worker cache invalidation through the DB (multi-worker mode only) --- ###
+class CacheBus:
+    def __init__(self):
+        self.origin = os.getpid()
+        self._task = None
+        self._last_id = 0
+        self.published = 0
+        self.applied = 0
+        self._handlers = {}  # kind -> func(key), for modules this one cannot import
+
+    async def publish(self, kind: str, *keys):
+        # the caller already updated its own caches; with a single process there is nobody to tell
+        if self._task is None or not keys:
+            return
+        try:
+            await ADB.add_invalidations([(kind, str(key)) for key in keys], self.origin)
+        except Exception as e:
+            print(f"Cache bus publish failed: {e}")
+            return
+        self.published += len(keys)
+
+    def on(self, kind: str, func):
+        self._handlers[kind] = func
+        return func
+
+    async def publish_user(self, *user_ids: int):
+        await self.publish("user", *user_ids)
+
+    async def publish_admin_panel(self):
+        await self.publish("admin_panel", json.dumps(ADMIN_PANEL))
+
+    def _apply(self, kind: str, key: str):
+        if kind == "user":
+            user_id = int(key)
+            ADB.forget_user(user_id)
+            TOKEN_CACHE.invalidate(user_id)
+        elif kind == "reload":
+            RELOADS[key]()
+        elif kind == "admin_panel":
+            ADMIN_PANEL.update(json.loads(key))
+        elif kind in self._handlers:
+            self._handlers[kind](key)
+
+    async def poll(self):
+        for row in await ADB.get_invalidations(self._last_id):
+            self._last_id = row["id"]
+            if row["origin"] == self.origin:
+                continue
+            try:
+                self._apply(row["kind"], row["key"])
+            except Exception as e:
+                print(f"Cache bus: failed to apply {row['kind']} {row['key']}: {e}")
+            self.applied += 1
+
+    async def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            settings = cache_bus_settings()
+            await asyncio.sleep(settings["poll_interval"])
+            try:
+                await self.poll()
+                if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    await ADB.prune_invalidations(int(time.time()) - settings["retention"])
+            except Exception as e:
+                print(f"Cache bus poll failed: {e}")
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            # only what is published from now on; caches start empty anyway
+            self._last_id = await ADB.last_invalidation_id()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"active": self._task is not None, "published": self.published, "applied": self.applied}
+
+CACHE_BUS = CacheBus()
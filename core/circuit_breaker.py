@@ -0,0 +1,82 @@
+import time
+
+from core.config_loader import CFG
+
+DEFAULT_CIRCUIT_BREAKER = {
+    "failure_threshold": 5,  # consecutive upstream failures that open the circuit
+    "reset_timeout": 30,     # seconds to fail fast before letting a probe through
+    "half_open_probes": 1    # calls allowed through at once while probing
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+def circuit_breaker_settings() -> dict:
+    settings = dict(DEFAULT_CIRCUIT_BREAKER)
+    settings.update(CFG.get("CIRCUIT_BREAKER", {}))
+    return settings
+
+### --- Circuit breaker (fail fast while an upstream is unhealthy) --- ###
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0      # consecutive, reset by any success
+        self.opened_at = 0.0
+        self.probes = 0        # calls in flight while half-open
+        self.rejected = 0
+        self.trips = 0
+
+    def _open(self):
+        if self.state != OPEN:
+            self.trips += 1
+            print(f"Circuit {self.name} opened after {self.failures} failures")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes = 0
+
+    def allow(self) -> bool:
+        # every allowed call must end in record_success, record_failure or release
+        settings = circuit_breaker_settings()
+        if self.state == OPEN and time.monotonic() - self.opened_at >= settings["reset_timeout"]:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.probes < settings["half_open_probes"]:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def rejecting(self) -> bool:
+        # open and still cooling down; does not use up a probe
+        return self.state == OPEN and time.monotonic() - self.opened_at < circuit_breaker_settings()["reset_timeout"]
+
+    def record_success(self):
+        if self.state == OPEN:
+            # a call admitted before the circuit opened, finishing late: only a probe may close it
+            return
+        if self.state == HALF_OPEN:
+            print(f"Circuit {self.name} closed")
+            self.state = CLOSED
+            self.probes = 0
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= circuit_breaker_settings()["failure_threshold"]:
+            self._open()
+
+    def release(self):
+        # the call was cancelled before it said anything about the upstream
+        if self.state == HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    def retry_in(self) -> int:
+        if self.state != OPEN:
+            return 0
+        return max(0, round(circuit_breaker_settings()["reset_timeout"] - (time.monotonic() - self.opened_at)))
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected, "trips": self.trips, "retry_in": self.retry_in()}
+
+RADARGAME_BREAKER = CircuitBreaker("radargame")
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from core.config_loader import CFG
+
+DEFAULT_CONFIG_ARCHIVE = {
+    "enabled": False,
+    "dir": "configs",
+    "retention_days": 7,
+    "max_files": 1000,
+    "cleanup_interval": 3600
+}
+
+def archive_settings() -> dict:
+    settings = dict(DEFAULT_CONFIG_ARCHIVE)
+    settings.update(CFG.get("CONFIG_ARCHIVE", {}))
+    return settings
+
+### --- Optional on-disk archive of generated configs --- ###
+class ConfigArchive:
+    def __init__(self):
+        self._task = None
+        self._pending = set()
+
+    def _write(self, directory: str, filename: str, content: str):
+        os.makedirs(directory, exist_ok=True)
+        Path(directory, filename).write_text(content, encoding="utf-8")
+
+    def _cleanup(self, directory: str, retention_days: float, max_files: int) -> int:
+        path = Path(directory)
+        if not path.is_dir():
+            return 0
+        files = sorted((entry for entry in path.glob("radar-*.conf") if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+        cutoff = time.time() - retention_days * 86400
+        expired = [entry for entry in files if entry.stat().st_mtime < cutoff]
+        kept = [entry for entry in files if entry.stat().st_mtime >= cutoff]
+        expired += kept[:max(0, len(kept) - max_files)]
+        for entry in expired:
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+        return len(expired)
+
+    def save(self, filename: str, content: str):
+        # fire-and-forget, the user never waits for the disk
+        settings = archive_settings()
+        if not settings["enabled"]:
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._write, settings["dir"], filename, content))
+        self._pending.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Failed to archive config: {task.exception()}")
+
+    async def cleanup(self) -> int:
+        settings = archive_settings()
+        return await asyncio.to_thread(self._cleanup, settings["dir"], settings["retention_days"], settings["max_files"])
+
+    async def _run(self):
+        while True:
+            if archive_settings()["enabled"]:
+                try:
+                    await self.cleanup()
+                except Exception as e:
+                    print(f"Config archive cleanup failed: {e}")
+            await asyncio.sleep(archive_settings()["cleanup_interval"])
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+CONFIG_ARCHIVE = ConfigArchive()
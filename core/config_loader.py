@@ -1,36 +1,174 @@
+import asyncio
+import itertools
 import json
+from collections.abc import Mapping
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
 from core.db import DB
+from core.async_db import AsyncDB
 
 # Paths
 CONFIG_PATH = Path("config/config.json")
 TEXTS_PATH = Path("config/texts.json")
 DNS_LIST_PATH = Path("config/custom_dns.json")
 
+### --- Immutable config snapshots --- ###
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    version: int
+    data: Mapping
+    admins: frozenset          # ADMINS + OWNERS
+    owners: frozenset
+    required_chats: tuple
+    required_chat_ids: frozenset
+
+_versions = itertools.count(1)
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+def load_snapshot() -> ConfigSnapshot:
+    data = _freeze(json.loads(CONFIG_PATH.read_text(encoding="utf-8")))
+    owners = frozenset(data.get("OWNERS", ()))
+    required_chats = data.get("REQUIRED_CHATS", ())
+    return ConfigSnapshot(
+        version=next(_versions),
+        data=data,
+        admins=frozenset(data.get("ADMINS", ())) | owners,
+        owners=owners,
+        required_chats=required_chats,
+        required_chat_ids=frozenset(chat["chat_id"] for chat in required_chats)
+    )
+
+_snapshot = load_snapshot()
+
+def config_snapshot() -> ConfigSnapshot:
+    # take it once per request when several values have to agree with each other
+    return _snapshot
+
+class ConfigView(Mapping):
+    # read-only CFG that always resolves against the current snapshot
+    def __getitem__(self, key):
+        return _snapshot.data[key]
+
+    def __iter__(self):
+        return iter(_snapshot.data)
+
+    def __len__(self):
+        return len(_snapshot.data)
+
 # Initial
-CFG = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+CFG = ConfigView()
 TEXTS = json.loads(TEXTS_PATH.read_text(encoding="utf-8"))
 DNS_LIST = json.loads(DNS_LIST_PATH.read_text(encoding="utf-8")).get('dns_list', [])
-DBH = DB(CFG["DB_PATH"])
+# the live DB handle is ADB.db, reload_config swaps it there
+ADB = AsyncDB(DB(CFG["DB_PATH"], CFG.get("USER_CACHE_SIZE", 10000), CFG.get("USER_CACHE_TTL", 300)), CFG.get("DB_READERS", 4))
+
+# called after every successful reload_* (e.g. to drop cached keyboards)
+RELOAD_HOOKS = []
+
+def add_reload_hook(func):
+    RELOAD_HOOKS.append(func)
+    return func
+
+def run_reload_hooks():
+    for hook in RELOAD_HOOKS:
+        hook()
 
 def reload_config():
-    global CFG, DBH
-    new_cfg = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
-    CFG.clear()
-    CFG.update(new_cfg)
-    DBH = DB(CFG["DB_PATH"])
+    global _snapshot
+    try:
+        new_snapshot = load_snapshot()
+    except Exception as e:
+        print(f"Failed to reload config: {e}")
+        return None
+    old_data = _snapshot.data
+    # one assignment: every reader sees either the old or the new snapshot, never a mix
+    _snapshot = new_snapshot
+    if (new_snapshot.data["DB_PATH"], new_snapshot.data.get("USER_CACHE_SIZE", 10000)) != (old_data["DB_PATH"], old_data.get("USER_CACHE_SIZE", 10000)):
+        ADB.swap(DB(CFG["DB_PATH"], CFG.get("USER_CACHE_SIZE", 10000), CFG.get("USER_CACHE_TTL", 300)))
+    else:
+        ADB.db.user_cache.ttl = CFG.get("USER_CACHE_TTL", 300)
+    run_reload_hooks()
     return CFG
 
 def reload_dns_list():
-    global DNS_LIST
-    new_dns_list = json.loads(DNS_LIST_PATH.read_text(encoding="utf-8")).get('dns_list', [])
+    try:
+        new_dns_list = json.loads(DNS_LIST_PATH.read_text(encoding="utf-8")).get('dns_list', [])
+    except Exception as e:
+        print(f"Failed to reload DNS list: {e}")
+        return None
     DNS_LIST.clear()
     DNS_LIST.extend(new_dns_list)
+    run_reload_hooks()
     return DNS_LIST
 
 def reload_texts():
-    global TEXTS
-    new_texts = json.loads(TEXTS_PATH.read_text(encoding="utf-8"))
+    try:
+        new_texts = json.loads(TEXTS_PATH.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"Failed to reload texts: {e}")
+        return None
     TEXTS.clear()
     TEXTS.update(new_texts)
-    return TEXTS
\ No newline at end of file
+    run_reload_hooks()
+    return TEXTS
+
+### --- Reload on file change (mtime polling) --- ###
+DEFAULT_CONFIG_WATCH = {
+    "interval": 5  # seconds between checks, 0 = only reload from the admin panel
+}
+
+class ConfigWatcher:
+    def __init__(self):
+        self._task = None
+        self._files = {CONFIG_PATH: reload_config, TEXTS_PATH: reload_texts, DNS_LIST_PATH: reload_dns_list}
+        self._mtimes = {path: _mtime(path) for path in self._files}
+
+    def interval(self) -> float:
+        settings = dict(DEFAULT_CONFIG_WATCH)
+        settings.update(CFG.get("CONFIG_WATCH", {}))
+        return settings["interval"]
+
+    def check(self) -> list:
+        # one stat() per file; reloads whatever changed since the last check
+        reloaded = []
+        for path, reload in self._files.items():
+            mtime = _mtime(path)
+            if mtime != self._mtimes[path]:
+                self._mtimes[path] = mtime
+                if reload() is not None:
+                    reloaded.append(path.name)
+        return reloaded
+
+    async def _run(self):
+        while self.interval() > 0:
+            await asyncio.sleep(self.interval())
+            for name in self.check():
+                print(f"Reloaded {name} (config version {_snapshot.version})")
+
+    def start(self):
+        if self.interval() > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+CONFIG_WATCHER = ConfigWatcher()
@@ -1,112 +1,201 @@
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 import time
 
+from core.cache import LRUCache
+from core.migrations import migrate
+
+# Applied once to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+    "PRAGMA cache_size=-16000",    # ~16 MiB page cache
+)
+BUSY_TIMEOUT = 5.0
+CACHED_STATEMENTS = 256
+
 class DB:
-    def __init__(self, path: str):
+    def __init__(self, path: str, user_cache_size: int = 10000, user_cache_ttl: float = 300):
         self.path = path
         Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # user_id -> users row (as dict), kept in sync by the write methods below;
+        # the TTL bounds how long a row missed by an invalidation can live
+        self.user_cache = LRUCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+        # bumped after every users write: a read only fills user_cache if it did not move meanwhile
+        self._user_generation = 0
+        self._generation_lock = threading.Lock()
+        # per-user account totals for the account picker, dropped by the write methods
+        self.account_counts = LRUCache(maxsize=user_cache_size)
+        # one long-lived connection per thread
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._init_db()
 
-    def _connect(self):
-        conn = sqlite3.connect(self.path)
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
-    def _init_db(self):
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            # users 
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                full_name TEXT,
-                user_hash TEXT UNIQUE,
-                usage_count INTEGER DEFAULT 0,
-                created_at INTEGER,
-                last_active INTEGER,
-                banned INTEGER DEFAULT 0
-            );
-            """)
-
-            # radargame
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS radargame (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                username TEXT NOT NULL,
-                password TEXT,
-                token TEXT,
-                is_active INTEGER DEFAULT 0,
-                created_at INTEGER,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            );
-            """)
+    def _connect(self) -> sqlite3.Connection:
+        # `with self._connect() as conn` commits/rolls back but keeps the connection open
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open_connection()
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
-            conn.commit()
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _init_db(self):
+        migrate(self._connect())
 
     # ——— users ———
     def count_users(self) -> int:
+        # maintained by the stats triggers (see core/migrations.py)
         with self._connect() as con:
-            cur = con.cursor()
-            return cur.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            return con.execute("SELECT value FROM stats WHERE key = 'total_users'").fetchone()[0]
 
-    def get_users_page(self, limit: int, offset: int):
+    def get_users_keyset(self, limit: int, after: Optional[tuple] = None, before: Optional[tuple] = None):
+        # `after` / `before` are the (created_at, user_id) of the last / first row already shown,
+        # so every page is an index range scan no matter how deep it is
         with self._connect() as con:
             cur = con.cursor()
-            cur.execute(
-                "SELECT * FROM users ORDER BY created_at ASC LIMIT ? OFFSET ?",
-                (limit, offset)
-            )
+            if before is not None:
+                cur.execute(
+                    "SELECT * FROM users WHERE (created_at, user_id) < (?, ?) ORDER BY created_at DESC, user_id DESC LIMIT ?",
+                    (*before, limit)
+                )
+                return cur.fetchall()[::-1]
+            if after is not None:
+                cur.execute(
+                    "SELECT * FROM users WHERE (created_at, user_id) > (?, ?) ORDER BY created_at ASC, user_id ASC LIMIT ?",
+                    (*after, limit)
+                )
+            else:
+                cur.execute("SELECT * FROM users ORDER BY created_at ASC, user_id ASC LIMIT ?", (limit,))
             return cur.fetchall()
-        
-    def get_user(self, user_id: int) -> Optional[sqlite3.Row]:
+
+    def _user_written(self):
+        with self._generation_lock:
+            self._user_generation += 1
+
+    def _fill_user_cache(self, row: Dict[str, Any], generation: int):
+        # a reader's row is stale if a write landed between its SELECT and now
+        with self._generation_lock:
+            if self._user_generation == generation:
+                self.user_cache.set(row["user_id"], row)
+
+    def invalidate_user(self, user_id: int):
+        self._user_written()
+        self.user_cache.pop(user_id)
+        self.account_counts.pop(user_id)
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self.user_cache.get(user_id)
+        if row is not None:
+            return row
+        generation = self._user_generation
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
-            return cursor.fetchone()
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        self._fill_user_cache(row, generation)
+        return row
 
-    def upsert_user(self, user_id: int, username: Optional[str], full_name: str, user_hash: str, now_ts: int) -> sqlite3.Row:
+    def upsert_user(self, user_id: int, username: Optional[str], full_name: str, user_hash: str, now_ts: int) -> Dict[str, Any]:
+        existing = self.get_user(user_id)
         with self._connect() as conn:
             cursor = conn.cursor()
-            existing = self.get_user(user_id)
             if existing:
                 cursor.execute("""UPDATE users SET username=?, full_name=?, last_active=?
                                WHERE user_id=?""", (username, full_name, now_ts, user_id))
+                row = dict(existing, username=username, full_name=full_name, last_active=now_ts)
             else:
                 cursor.execute("""INSERT INTO users (user_id, username, full_name, user_hash, created_at, last_active)
                                VALUES (?, ?, ?, ?, ?, ?)""",
                             (user_id, username, full_name, user_hash, now_ts, now_ts))
+                row = dict(cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone())
             conn.commit()
-        return self.get_user(user_id)
+        self._user_written()
+        self.user_cache.set(user_id, row)
+        return row
     
-    def add_user_usage(self, user_id: int) -> sqlite3.Row:
+    def apply_user_activity(self, last_active: Dict[int, int], usage: Dict[int, int]):
+        # batched write-behind flush, one transaction
         with self._connect() as conn:
             cursor = conn.cursor()
-            existing = self.get_user(user_id)
-            if existing:
-                cursor.execute("UPDATE users SET usage_count = usage_count + 1 WHERE user_id=?", (user_id))
+            cursor.executemany("UPDATE users SET last_active=MAX(COALESCE(last_active, 0), ?) WHERE user_id=?",
+                               [(ts, user_id) for user_id, ts in last_active.items()])
+            cursor.executemany("UPDATE users SET usage_count = usage_count + ? WHERE user_id=?",
+                               [(count, user_id) for user_id, count in usage.items()])
             conn.commit()
-        return self.get_user(user_id)
+        self._user_written()
 
     def set_ban(self, user_id: int, banned: bool):
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("UPDATE users SET banned=? WHERE user_id=?", (1 if banned else 0, user_id))
             conn.commit()
+        self._user_written()
+        existing = self.user_cache.get(user_id)
+        if existing is not None:
+            self.user_cache.set(user_id, dict(existing, banned=1 if banned else 0))
 
-    def find_user_by_any(self, key: str) -> Optional[sqlite3.Row]:
+    def status_counts(self, days: int = 7) -> Dict[str, Any]:
+        # O(1) reads: the stats triggers keep these rows current
         with self._connect() as conn:
             cursor = conn.cursor()
-            if key.isdigit():
-                cursor.execute("SELECT * FROM users WHERE user_id=?", (int(key),))
-            elif key.startswith('@'):
+            counts = {row["key"]: row["value"] for row in cursor.execute("SELECT key, value FROM stats")}
+            history = [dict(row) for row in cursor.execute(
+                "SELECT * FROM daily_stats WHERE day > date('now', 'localtime', ?) ORDER BY day DESC",
+                (f"-{days} days",)
+            )]
+            today = cursor.execute("SELECT date('now', 'localtime')").fetchone()[0]
+        today_row = history[0] if history and history[0]["day"] == today else {}
+        counts.update(
+            today_active=today_row.get("active_users", 0),
+            today_new_users=today_row.get("new_users", 0),
+            today_configs=today_row.get("configs", 0),
+            history=history
+        )
+        return counts
+
+    def find_user_by_any(self, key: str) -> Optional[Dict[str, Any]]:
+        if key.isdigit():
+            return self.get_user(int(key))
+        generation = self._user_generation
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if key.startswith('@'):
                 cursor.execute("SELECT * FROM users WHERE username=?", (key[1:],))
             else:
                 cursor.execute("SELECT * FROM users WHERE user_hash=?", (key,))
-            return cursor.fetchone()
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        self._fill_user_cache(row, generation)
+        return row
 
     def stats_for_user(self, user_id: int) -> Dict[str, Any]:
         with self._connect() as conn:
@@ -125,22 +214,107 @@ class DB:
                 "banned": user_data["banned"] if user_data else None,
             }
 
-    # ===== radargame =====
-    def add_radargame_account(self, user_id: int, username: str, password: str, token=None):
+    def set_blocked(self, user_ids, blocked: bool = True):
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO radargame (user_id, username, password, token, created_at) VALUES (?, ?, ?, ?, ?)",
-                           (user_id, username, password, token, int(time.time())))
+            cursor.executemany("UPDATE users SET blocked=? WHERE user_id=?", [(1 if blocked else 0, user_id) for user_id in user_ids])
+            conn.commit()
+        self._user_written()
+        for user_id in user_ids:
+            existing = self.user_cache.get(user_id)
+            if existing is not None:
+                self.user_cache.set(user_id, dict(existing, blocked=1 if blocked else 0))
+
+    # ===== broadcast =====
+    def count_broadcast_recipients(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            return cursor.execute("SELECT COUNT(*) FROM users WHERE banned=0 AND blocked=0").fetchone()[0]
+
+    def get_broadcast_recipients(self, after_user_id: int, limit: int):
+        # keyset scan over the primary key, so a job can resume from its stored cursor
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_id FROM users WHERE user_id > ? AND banned=0 AND blocked=0 ORDER BY user_id LIMIT ?",
+                           (after_user_id, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    def create_broadcast_job(self, owner_id: int, from_chat_id: int, message_id: int, target_user_id: Optional[int], total: int) -> int:
+        now = int(time.time())
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""INSERT INTO broadcast_jobs (owner_id, from_chat_id, message_id, target_user_id, total, created_at, updated_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""", (owner_id, from_chat_id, message_id, target_user_id, total, now, now))
+            conn.commit()
+            return cursor.lastrowid
+
+    def get_broadcast_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            row = cursor.execute("SELECT * FROM broadcast_jobs WHERE id=?", (job_id,)).fetchone()
+            return dict(row) if row else None
+
+    def get_broadcast_jobs_by_status(self, status: str):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            return [dict(row) for row in cursor.execute("SELECT * FROM broadcast_jobs WHERE status=? ORDER BY id", (status,)).fetchall()]
+
+    def update_broadcast_job(self, job_id: int, **fields):
+        columns = ", ".join(f"{name}=?" for name in fields)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"UPDATE broadcast_jobs SET {columns}, updated_at=? WHERE id=?", (*fields.values(), int(time.time()), job_id))
+            conn.commit()
+
+    def claim_broadcast_job(self, job_id: int, runner: str, from_statuses: tuple) -> bool:
+        # compare-and-set, only one worker wins a job
+        with self._connect() as conn:
+            cursor = conn.execute(f"UPDATE broadcast_jobs SET status='running', runner=?, updated_at=? WHERE id=? AND status IN ({','.join('?' * len(from_statuses))})",
+                                  (runner, int(time.time()), job_id, *from_statuses))
             conn.commit()
+        return cursor.rowcount == 1
+
+    def set_broadcast_job_status(self, job_id: int, status: str, from_statuses: tuple, runner: Optional[str] = None) -> bool:
+        # runner: only while that task still owns the job
+        sql = f"UPDATE broadcast_jobs SET status=?, updated_at=? WHERE id=? AND status IN ({','.join('?' * len(from_statuses))})"
+        params = [status, int(time.time()), job_id, *from_statuses]
+        if runner is not None:
+            sql += " AND runner=?"
+            params.append(runner)
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+        return cursor.rowcount == 1
+
+    def update_broadcast_progress(self, job_id: int, runner: str, **fields) -> bool:
+        columns = ", ".join(f"{name}=?" for name in fields)
+        with self._connect() as conn:
+            cursor = conn.execute(f"UPDATE broadcast_jobs SET {columns}, updated_at=? WHERE id=? AND runner=?", (*fields.values(), int(time.time()), job_id, runner))
+            conn.commit()
+        return cursor.rowcount == 1
+
+    # ===== radargame =====
+    def add_radargame_account(self, user_id: int, username: str, password: str, token=None, token_expires_at=None) -> bool:
+        # (user_id, username) is UNIQUE, a duplicate account is rejected by the insert itself
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO radargame (user_id, username, password, token, token_expires_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                               (user_id, username, password, token, token_expires_at, int(time.time())))
+                conn.commit()
+        except sqlite3.IntegrityError:
+            return False
+        self.account_counts.pop(user_id)
         self.set_active_radargame(user_id, username)
+        return True
 
-    def radargame_username_exists(self, user_id: int, account_username: str) -> bool:
+    def set_radargame_token(self, user_id: int, account_username: str, token: Optional[str], token_expires_at: Optional[int]):
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM radargame WHERE user_id=? AND username=?", (user_id, account_username))
-            count = cursor.fetchone()[0]
-            return count > 0
-        
+            cursor.execute("UPDATE radargame SET token=?, token_expires_at=? WHERE user_id=? AND username=?",
+                           (token, token_expires_at, user_id, account_username))
+            conn.commit()
+
     def set_active_radargame(self, user_id: int, account_username: str) -> bool:
         with self._connect() as conn:
             cursor = conn.cursor()
@@ -157,6 +331,30 @@ class DB:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM radargame WHERE user_id = ?", (user_id,))
             return cursor.fetchall()
+
+    def get_radargame_account(self, user_id: int, account_id: int):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM radargame WHERE id = ? AND user_id = ?", (account_id, user_id))
+            return cursor.fetchone()
+
+    def count_user_radargame_accounts(self, user_id: int) -> int:
+        count = self.account_counts.get(user_id)
+        if count is None:
+            with self._connect() as conn:
+                count = conn.execute("SELECT COUNT(*) FROM radargame WHERE user_id = ?", (user_id,)).fetchone()[0]
+            self.account_counts.set(user_id, count)
+        return count
+
+    def get_radargame_accounts_keyset(self, user_id: int, limit: int, after_id: Optional[int] = None, before_id: Optional[int] = None):
+        # same idea as get_users_keyset, accounts are listed in id order
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if before_id is not None:
+                cursor.execute("SELECT * FROM radargame WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (user_id, before_id, limit))
+                return cursor.fetchall()[::-1]
+            cursor.execute("SELECT * FROM radargame WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?", (user_id, after_id or 0, limit))
+            return cursor.fetchall()
         
     def get_active_radargame_account(self, user_id: int):
         with self._connect() as conn:
@@ -169,11 +367,77 @@ class DB:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM radargame WHERE user_id=? AND username=?", (user_id, account_username))
             conn.commit()
-            return cursor.rowcount > 0
+        self.account_counts.pop(user_id)
+        return cursor.rowcount > 0
 
     def delete_all_radargame_accounts_for_user(self, user_id: int) -> int:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM radargame WHERE user_id = ?", (user_id,))
             conn.commit()
-            return cursor.rowcount
+        self.account_counts.pop(user_id)
+        return cursor.rowcount
+
+    # ===== persistence (core/persistence.py) =====
+    def get_persisted_data(self, scope: str, owner_id: int) -> Dict[str, str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, value FROM persisted_data WHERE scope = ? AND owner_id = ?", (scope, owner_id)).fetchall()
+        return {row["key"]: row["value"] for row in rows}
+
+    def get_conversations(self, name: str) -> Dict[str, str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT conv_key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+        return {row["conv_key"]: row["state"] for row in rows}
+
+    def apply_persistence_changes(self, data: Dict[tuple, Optional[str]], conversations: Dict[tuple, Optional[str]]):
+        # (scope, owner_id, key) / (name, conv_key) -> JSON, None deletes; one transaction
+        now = int(time.time())
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("INSERT OR REPLACE INTO persisted_data (scope, owner_id, key, value, updated_at) VALUES (?, ?, ?, ?, ?)",
+                               [(*key, value, now) for key, value in data.items() if value is not None])
+            cursor.executemany("DELETE FROM persisted_data WHERE scope = ? AND owner_id = ? AND key = ?",
+                               [key for key, value in data.items() if value is None])
+            cursor.executemany("INSERT OR REPLACE INTO conversations (name, conv_key, state, updated_at) VALUES (?, ?, ?, ?)",
+                               [(*key, state, now) for key, state in conversations.items() if state is not None])
+            cursor.executemany("DELETE FROM conversations WHERE name = ? AND conv_key = ?",
+                               [key for key, state in conversations.items() if state is None])
+            conn.commit()
+
+    def drop_persisted_data(self, scope: str, owner_id: int):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM persisted_data WHERE scope = ? AND owner_id = ?", (scope, owner_id))
+            conn.commit()
+
+    def get_bot_settings(self) -> Dict[str, str]:
+        with self._connect() as conn:
+            return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM bot_settings").fetchall()}
+
+    def set_bot_settings(self, values: Dict[str, str]):
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO bot_settings (key, value, updated_at) VALUES (?, ?, ?)", [(key, value, now) for key, value in values.items()])
+            conn.commit()
+
+    def add_invalidations(self, events: List[tuple], origin: int):
+        # events: [(kind, key)]
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO cache_invalidations (kind, key, origin, created_at) VALUES (?, ?, ?, ?)",
+                             [(kind, key, origin, now) for kind, key in events])
+            conn.commit()
+
+    def get_invalidations(self, after_id: int, limit: int = 500) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, kind, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_invalidation_id(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+
+    def prune_invalidations(self, before_ts: int) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (before_ts,))
+            conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,159 @@
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from core.cache import LRUCache
+from core.config_loader import CFG, TEXTS, add_reload_hook
+from core.metrics import METRICS
+from core.ratelimit import TokenBucket, KeyedTokenBuckets
+from core.workers import local_share
+
+# rate = tokens per second, burst = bucket size; a rate of 0 means no limit;
+# global limits are for the whole bot, in multi-worker mode each worker enforces 1/count
+DEFAULT_RATE_LIMITS = {
+    "enabled": True,
+    "classes": {
+        "menu":   {"user_rate": 1,   "user_burst": 8,  "global_rate": 100, "global_burst": 200},
+        "config": {"user_rate": 0.2, "user_burst": 8,  "global_rate": 30,  "global_burst": 60},
+        "admin":  {"user_rate": 2,   "user_burst": 10, "global_rate": 0,   "global_burst": 0}
+    },
+    "notice_interval": 10,  # seconds between "slow down" replies to one user
+    "abuse_threshold": 30,  # rejected updates within abuse_window that count as abuse
+    "abuse_window": 60
+}
+
+# callback_data prefix / command -> action class
+CALLBACK_CLASSES = {
+    "new_config": "config",
+    "server_": "config",
+    "dns_": "config",
+    "new_account": "config",
+    "admin_": "admin",
+    "show_users:": "admin",
+    "toggle_": "admin",
+    "status_panel": "admin",
+    "reload_": "admin",
+    "adminpanel": "admin",
+    "bcast:": "admin",
+}
+ADMIN_COMMANDS = frozenset({"users", "user", "adminpanel", "broadcast"})
+
+def rate_limit_settings() -> dict:
+    settings = dict(DEFAULT_RATE_LIMITS)
+    settings.update(CFG.get("RATE_LIMITS", {}))
+    # each class over its defaults, so {"config": {"user_rate": 0.5}} keeps the other config limits
+    classes = {name: dict(limits) for name, limits in DEFAULT_RATE_LIMITS["classes"].items()}
+    for name, limits in settings["classes"].items():
+        classes.setdefault(name, {}).update(limits)
+    settings["classes"] = classes
+    return settings
+
+def action_class(update) -> str | None:
+    # None: not limited (membership updates, channel posts, ...)
+    if not isinstance(update, Update) or update.effective_user is None:
+        return None
+    if update.callback_query:
+        data = update.callback_query.data or ""
+        for prefix, action in CALLBACK_CLASSES.items():
+            if data.startswith(prefix):
+                return action
+        return "menu"
+    message = update.message
+    if message is None:
+        return None
+    text = message.text or ""
+    if text.startswith("/"):
+        command = (text[1:].split(maxsplit=1) or [""])[0].split("@")[0].lower()
+        if command in ADMIN_COMMANDS:
+            return "admin"
+    return "menu"
+
+### --- Token-bucket limits in front of every handler (handler group -1) --- ###
+class FloodGuard:
+    def __init__(self):
+        self._strikes = LRUCache(maxsize=10000)  # user_id -> [window start, rejections in window]
+        self._noticed = LRUCache(maxsize=10000)  # user_id -> last "slow down" reply
+        self.abusers = LRUCache(maxsize=1000)    # user_id -> times the abuse threshold was crossed
+        self.rejected = {}                       # action -> rejected updates
+        self._limits = None                      # the limits the buckets were built with
+        self.reset()
+
+    def reset(self):
+        # (re)build the buckets from RATE_LIMITS, used at start and after a reload; every reload
+        # (texts, DNS, other workers' via the cache bus) lands here, so only when the limits or the
+        # worker count changed, otherwise a flooding user would get full buckets again
+        limits = {action: (limits["user_rate"], limits["user_burst"], local_share(limits["global_rate"]), local_share(limits["global_burst"]))
+                  for action, limits in rate_limit_settings()["classes"].items()}
+        if limits == self._limits:
+            return
+        self._limits = limits
+        self._user = {}
+        self._global = {}
+        for action, (user_rate, user_burst, global_rate, global_burst) in limits.items():
+            self._user[action] = KeyedTokenBuckets(user_rate, user_burst, maxsize=50000) if user_rate else None
+            self._global[action] = TokenBucket(global_rate, global_burst) if global_rate else None
+
+    def _allow(self, action: str, user_id: int) -> str | None:
+        # returns the scope that rejected the update; the user's bucket is asked
+        # first, so a flooding user cannot drain the global one
+        user_buckets = self._user.get(action)
+        if user_buckets is not None and not user_buckets.try_acquire(user_id):
+            return "user"
+        global_bucket = self._global.get(action)
+        if global_bucket is not None and not global_bucket.try_acquire():
+            return "global"
+        return None
+
+    def _strike(self, user_id: int, settings: dict):
+        now = time.monotonic()
+        strike = self._strikes.get(user_id)
+        if strike is None or now - strike[0] > settings["abuse_window"]:
+            strike = [now, 0]
+        strike[1] += 1
+        self._strikes.set(user_id, strike)
+        if strike[1] == settings["abuse_threshold"]:
+            self.abusers.set(user_id, self.abusers.get(user_id, 0) + 1)
+            METRICS.counter("bot_abuse_total", "Users crossing the rate limit abuse threshold").inc()
+            print(f"Rate limit abuse: user {user_id} had {strike[1]} updates rejected within {settings['abuse_window']}s")
+
+    async def _answer(self, update: Update, user_id: int, settings: dict):
+        # one API call at most, no DB access
+        if update.callback_query:
+            try:
+                await update.callback_query.answer(TEXTS["errors"]["rate_limited"])
+            except Exception as e:
+                print(f"Failed to answer rate limited callback: {e}")
+            return
+        now = time.monotonic()
+        if now - self._noticed.get(user_id, 0.0) < settings["notice_interval"]:
+            return
+        self._noticed.set(user_id, now)
+        try:
+            await update.effective_chat.send_message(TEXTS["errors"]["rate_limited"])
+        except Exception as e:
+            print(f"Failed to send rate limit notice: {e}")
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        settings = rate_limit_settings()
+        action = action_class(update) if settings["enabled"] else None
+        if action is None:
+            return
+        user_id = update.effective_user.id
+        scope = self._allow(action, user_id)
+        if scope is None:
+            return
+
+        self.rejected[action] = self.rejected.get(action, 0) + 1
+        METRICS.counter("bot_rate_limited_total", "Updates dropped by the rate limiter", action=action, scope=scope).inc()
+        if scope == "user":
+            self._strike(user_id, settings)
+        await self._answer(update, user_id, settings)
+        # no other handler group sees this update
+        raise ApplicationHandlerStop
+
+    def stats(self) -> dict:
+        return {"rejected": sum(self.rejected.values()), "rejected_by_action": dict(self.rejected), "abusers": len(self.abusers)}
+
+FLOOD_GUARD = FloodGuard()
+add_reload_hook(FLOOD_GUARD.reset)
@@ -0,0 +1,76 @@
+import random
+
+import httpx
+
+from core.config_loader import CFG
+
+# Shared RadarGame API client (keep-alive pool, HTTP/1.1)
+_client: httpx.AsyncClient | None = None
+
+DEFAULT_HTTP_SETTINGS = {
+    "timeout": 10,
+    "connect_timeout": 5,
+    "pool_timeout": 5,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30,
+    "call_timeouts": {},
+    "deadline": 20,            # seconds for a call including its retries
+    "call_deadlines": {},
+    "retries": 2,              # extra attempts, GET only
+    "retry_backoff": 0.3,
+    "retry_backoff_max": 3
+}
+
+### --- Settings --- ###
+def http_settings() -> dict:
+    settings = dict(DEFAULT_HTTP_SETTINGS)
+    settings.update(CFG.get("RADARGAME_HTTP", {}))
+    return settings
+
+def api_base() -> str:
+    return CFG["RADARGAME_API_BASE"].rstrip("/")
+
+def call_timeout(name: str) -> httpx.Timeout:
+    settings = http_settings()
+    total = settings["call_timeouts"].get(name, settings["timeout"])
+    return httpx.Timeout(total, connect=min(total, settings["connect_timeout"]), pool=settings["pool_timeout"])
+
+def call_deadline(name: str) -> float:
+    settings = http_settings()
+    return settings["call_deadlines"].get(name, settings["deadline"])
+
+def retry_delay(attempt: int) -> float:
+    # exponential backoff with full jitter, attempt starts at 1
+    settings = http_settings()
+    return random.uniform(0, min(settings["retry_backoff_max"], settings["retry_backoff"] * 2 ** (attempt - 1)))
+
+def _build_client() -> httpx.AsyncClient:
+    settings = http_settings()
+    return httpx.AsyncClient(
+        http1=True,
+        http2=False,
+        timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"], pool=settings["pool_timeout"]),
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"]
+        ),
+        headers={"Accept": "application/json"}
+    )
+
+### --- Lifecycle --- ###
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+async def start_http_client():
+    get_http_client()
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
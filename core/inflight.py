@@ -0,0 +1,54 @@
+from telegram import Update
+
+from core.config_loader import TEXTS
+
+# callback_data prefix -> operation; while one is queued or running for a user,
+# further taps of the same operation are answered with a toast and dropped
+EXPENSIVE_CALLBACKS = {
+    "new_config": "new_config",
+    "dns_": "config_file",
+}
+
+### --- Per-user registry of expensive operations in flight --- ###
+class InflightRegistry:
+    def __init__(self):
+        self._running = set()  # (user_id, operation)
+        self.started = 0
+        self.suppressed = {}   # operation -> duplicate taps dropped
+
+    def operation(self, update) -> tuple | None:
+        if not isinstance(update, Update) or not update.callback_query or not update.effective_user:
+            return None
+        data = update.callback_query.data or ""
+        for prefix, operation in EXPENSIVE_CALLBACKS.items():
+            if data.startswith(prefix):
+                return update.effective_user.id, operation
+        return None
+
+    def claim(self, key: tuple) -> bool:
+        # called on arrival, before the update waits for the user's earlier updates
+        if key in self._running:
+            self.suppressed[key[1]] = self.suppressed.get(key[1], 0) + 1
+            return False
+        self._running.add(key)
+        self.started += 1
+        return True
+
+    def release(self, key: tuple):
+        self._running.discard(key)
+
+    async def answer_duplicate(self, update: Update):
+        try:
+            await update.callback_query.answer(TEXTS["errors"]["already_processing"])
+        except Exception as e:
+            print(f"Failed to answer duplicate callback: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._running),
+            "started": self.started,
+            "suppressed": sum(self.suppressed.values()),
+            "suppressed_by_operation": dict(self.suppressed)
+        }
+
+INFLIGHT = InflightRegistry()
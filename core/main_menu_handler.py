@@ -1,12 +1,19 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
-from core.config_loader import DBH, CFG, TEXTS
+from core.config_loader import ADB, CFG, TEXTS
 from core.radargame_core import new_config
 from core.utils import check_user, now_ts, fmt_ts, human_ago
+from core.markup_cache import MARKUPS, back_to_main_markup
 
 ### --- Main Menu --- ###
 def main_menu_keyboard():
+    return MARKUPS.get("main_menu", build_main_menu_keyboard)
+
+def main_menu_text():
+    return MARKUPS.get("main_menu_text", lambda: TEXTS["main_menu"]["title"].format(version=CFG["VERSION"]))
+
+def build_main_menu_keyboard():
     button_text = TEXTS["main_menu"]["buttons"]
     rows = [
         [InlineKeyboardButton(button_text["new_config"], callback_data="new_config")],
@@ -19,11 +26,10 @@ def main_menu_keyboard():
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
     if not await check_user(update, context):
         return
-    main_menu_text = TEXTS["main_menu"]["title"].format(version=CFG["VERSION"])
     if edit and update.callback_query:
-        await update.callback_query.edit_message_text(f'{main_menu_text}', reply_markup=main_menu_keyboard(), parse_mode="HTML")
+        await update.callback_query.edit_message_text(main_menu_text(), reply_markup=main_menu_keyboard(), parse_mode="HTML")
     else:
-        await update.effective_chat.send_message(f'{main_menu_text}', reply_markup=main_menu_keyboard(), parse_mode="HTML")
+        await update.effective_chat.send_message(main_menu_text(), reply_markup=main_menu_keyboard(), parse_mode="HTML")
 
 ### --- Main Menu Callbacks --- ###
 async def main_menu_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -43,7 +49,7 @@ async def main_menu_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     elif data == "profile":
-        user_data = DBH.stats_for_user(user_id)
+        user_data = await ADB.stats_for_user(user_id)
         now = now_ts()
         txt = TEXTS["profile"].format(
             full_name=user_data["full_name"] or "-",
@@ -57,9 +63,9 @@ async def main_menu_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE
             last_active=fmt_ts(user_data["last_active"]),
             last_ago=human_ago(now - user_data["last_active"]),
         )
-        await query.edit_message_text(txt, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["backtomain"], callback_data="backtomain")]]), parse_mode="HTML")
+        await query.edit_message_text(txt, reply_markup=back_to_main_markup(), parse_mode="HTML")
         return
     
     elif data == "help":
-        await query.edit_message_text(TEXTS["help_text"], reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["backtomain"], callback_data="backtomain")]]), parse_mode="HTML")
+        await query.edit_message_text(TEXTS["help_text"], reply_markup=back_to_main_markup(), parse_mode="HTML")
         return
\ No newline at end of file
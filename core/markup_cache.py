@@ -0,0 +1,30 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from core.config_loader import TEXTS, add_reload_hook
+
+### --- Keyboards and static texts built once, dropped on reload --- ###
+class MarkupCache:
+    def __init__(self):
+        self._items = {}
+        self.builds = 0
+
+    def get(self, key, build):
+        # key carries any state the item depends on, e.g. ("admin_panel", True, False)
+        item = self._items.get(key)
+        if item is None:
+            item = self._items[key] = build()
+            self.builds += 1
+        return item
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "builds": self.builds}
+
+MARKUPS = MarkupCache()
+# texts, DNS list and config all feed these, any reload starts over
+add_reload_hook(MARKUPS.clear)
+
+def back_to_main_markup() -> InlineKeyboardMarkup:
+    return MARKUPS.get("back_to_main", lambda: InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["backtomain"], callback_data="backtomain")]]))
@@ -0,0 +1,80 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.error import Forbidden, BadRequest
+
+from core.config_loader import CFG, config_snapshot
+from core.cache import LRUCache
+from core.cache_bus import CACHE_BUS
+
+DEFAULT_MEMBERSHIP_CACHE = {
+    "ttl": 600,
+    "negative_ttl": 30,
+    "bot_ttl": 600,
+    "max_entries": 50000
+}
+JOINED_STATUSES = ("member", "administrator", "creator")
+BOT_OK, BOT_NOT_JOINED, BOT_NO_ACCESS = "ok", "not_joined", "no_access"
+
+def membership_settings() -> dict:
+    settings = dict(DEFAULT_MEMBERSHIP_CACHE)
+    settings.update(CFG.get("MEMBERSHIP_CACHE", {}))
+    return settings
+
+# (chat_id, user_id) -> joined
+MEMBER_CACHE = LRUCache(maxsize=membership_settings()["max_entries"])
+# chat_id -> BOT_OK / BOT_NOT_JOINED / BOT_NO_ACCESS
+BOT_STATUS_CACHE = LRUCache(maxsize=1000)
+
+def _remember_member(chat_id: int, user_id: int, joined: bool):
+    settings = membership_settings()
+    MEMBER_CACHE.set((chat_id, user_id), joined, ttl=settings["ttl"] if joined else settings["negative_ttl"])
+
+### --- Cached membership lookups --- ###
+async def is_member_cached(bot, chat_id: int, user_id: int) -> bool:
+    joined = MEMBER_CACHE.get((chat_id, user_id))
+    if joined is not None:
+        return joined
+    try:
+        member = await bot.get_chat_member(chat_id, user_id)
+        joined = member.status in JOINED_STATUSES
+    except Forbidden:
+        # Bot cannot access member info (maybe not an admin in channel/group)
+        joined = False
+    _remember_member(chat_id, user_id, joined)
+    return joined
+
+async def bot_chat_status(bot, chat_id: int) -> str:
+    status = BOT_STATUS_CACHE.get(chat_id)
+    if status is not None:
+        return status
+    try:
+        bot_member = await bot.get_chat_member(chat_id, bot.id)
+        status = BOT_NOT_JOINED if bot_member.status in ["left", "kicked"] else BOT_OK
+    except BadRequest:
+        status = BOT_NO_ACCESS
+    BOT_STATUS_CACHE.set(chat_id, status, ttl=membership_settings()["bot_ttl"])
+    return status
+
+def invalidate_chat(chat_id: int):
+    BOT_STATUS_CACHE.pop(chat_id)
+    MEMBER_CACHE.discard_where(lambda key: key[0] == chat_id)
+
+# every worker caches the bot's status in every chat
+CACHE_BUS.on("chat", lambda key: invalidate_chat(int(key)))
+
+### --- ChatMemberUpdated handler (keeps the caches in sync) --- ###
+async def chat_member_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    changed = update.chat_member or update.my_chat_member
+    if changed is None:
+        return
+
+    chat_id = changed.chat.id
+    member = changed.new_chat_member
+    if member.user.id == context.bot.id:
+        # bot itself was added/removed/promoted, recheck on next use
+        invalidate_chat(chat_id)
+        await CACHE_BUS.publish("chat", chat_id)
+        return
+    if chat_id not in config_snapshot().required_chat_ids:
+        return
+    _remember_member(chat_id, member.user.id, member.status in JOINED_STATUSES)
@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import math
+import time
+
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+
+# seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+### --- Metric types (all updated from the event loop thread) --- ###
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+
+    def quantile(self, q: float) -> float:
+        # linear interpolation inside the bucket holding the q-th observation
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound if not math.isinf(bound) else lower
+        return lower
+
+### --- Registry + Prometheus text format --- ###
+def _labels_text(labels: tuple, extra: str = "") -> str:
+    parts = [f'{key}="{str(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}  # name -> (type, help, {labels tuple: metric})
+
+    def _get(self, kind, name: str, help_text: str, labels: dict):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, {})
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = kind()
+        return metric
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        return self._get(Histogram, name, help_text, labels)
+
+    def family(self, name: str) -> dict:
+        # {labels dict as tuple: metric}
+        family = self._families.get(name)
+        return family[2] if family else {}
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, metrics) in sorted(self._families.items()):
+            type_name = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[kind]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, metric in metrics.items():
+                if kind is Histogram:
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, metric.counts):
+                        cumulative += count
+                        le = 'le="' + _number(bound) + '"'
+                        lines.append(f"{name}_bucket{_labels_text(labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels_text(labels)} {metric.sum}")
+                    lines.append(f"{name}_count{_labels_text(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_labels_text(labels)} {_number(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+
+### --- Handler instrumentation --- ###
+def instrument_handler(callback):
+    # latency + error count per handler, labelled with the function name
+    name = callback.__name__
+    latency = METRICS.histogram("bot_handler_seconds", "Handler latency", handler=name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            METRICS.counter("bot_handler_errors_total", "Handler exceptions", handler=name).inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    return wrapper
+
+### --- Bot API calls --- ###
+class InstrumentedRequest(HTTPXRequest):
+    # PTB's httpx transport, counting and timing every Bot API method
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        status = "error"
+        try:
+            code, payload = await super().do_request(url, method, request_data=request_data, **kwargs)
+            status = str(code)
+            return code, payload
+        finally:
+            METRICS.histogram("bot_api_seconds", "Bot API call latency", method=endpoint).observe(time.perf_counter() - started)
+            METRICS.counter("bot_api_requests_total", "Bot API calls by HTTP status", method=endpoint, status=status).inc()
+
+### --- Event loop lag --- ###
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task = None
+        self.histogram = METRICS.histogram("bot_event_loop_lag_seconds", "How late a sleep of `interval` wakes up")
+        self.gauge = METRICS.gauge("bot_event_loop_lag_last_seconds", "Most recent event loop lag")
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.histogram.observe(lag)
+            self.gauge.set(lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+LOOP_LAG = LoopLagMonitor()
+
+### --- Local /metrics endpoint --- ###
+class MetricsServer:
+    def __init__(self):
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            path = request_line.split(b" ", 2)[1] if request_line.count(b" ") >= 2 else b""
+            if path.split(b"?")[0] == b"/metrics":
+                status, body = b"200 OK", METRICS.render().encode()
+            else:
+                status, body = b"404 Not Found", b"not found\n"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+METRICS_SERVER = MetricsServer()
+
+### --- Short summary for the admin status panel --- ###
+def latency_summary(name: str, label: str, limit: int = 5) -> list:
+    # [(label value, count, p50 ms, p99 ms)], slowest p99 first
+    rows = []
+    for labels, histogram in METRICS.family(name).items():
+        if histogram.count:
+            value = dict(labels).get(label, "-")
+            rows.append((value, histogram.count, histogram.quantile(0.50) * 1000, histogram.quantile(0.99) * 1000))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows[:limit]
+
+def counter_total(name: str, **match) -> float:
+    # sum of a counter family over every label set that contains `match`
+    return sum(counter.value for labels, counter in METRICS.family(name).items() if match.items() <= dict(labels).items())
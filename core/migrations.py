@@ -0,0 +1,253 @@
+import sqlite3
+
+# ——— schema migrations ———
+# Applied in order, each in its own transaction. PRAGMA user_version stores
+# how many of them the database already has. Only ever append to MIGRATIONS.
+
+def _base_schema(cursor: sqlite3.Cursor):
+    # users
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        user_hash TEXT UNIQUE,
+        usage_count INTEGER DEFAULT 0,
+        created_at INTEGER,
+        last_active INTEGER,
+        banned INTEGER DEFAULT 0
+    );
+    """)
+
+    # radargame
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS radargame (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        password TEXT,
+        token TEXT,
+        is_active INTEGER DEFAULT 0,
+        created_at INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    );
+    """)
+
+def _radargame_token_expiry(cursor: sqlite3.Cursor):
+    # databases created before migrations existed may already have it
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(radargame)")}
+    if "token_expires_at" not in columns:
+        cursor.execute("ALTER TABLE radargame ADD COLUMN token_expires_at INTEGER")
+
+def _hot_query_indexes(cursor: sqlite3.Cursor):
+    # keep one row of any duplicated (user_id, username) pair before adding the constraint:
+    # the active one if there is one (else the user would lose their active account), otherwise the newest
+    cursor.execute("""
+    DELETE FROM radargame WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, username ORDER BY is_active DESC, id DESC) AS n
+            FROM radargame
+        ) WHERE n > 1
+    )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_radargame_user_username ON radargame(user_id, username)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_banned ON users(banned)")
+
+def _broadcast_jobs(cursor: sqlite3.Cursor):
+    # users that blocked the bot are skipped by later broadcasts
+    cursor.execute("ALTER TABLE users ADD COLUMN blocked INTEGER DEFAULT 0")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_id INTEGER NOT NULL,
+        from_chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        target_user_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'running',
+        cursor INTEGER NOT NULL DEFAULT 0,
+        total INTEGER DEFAULT 0,
+        success INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        blocked INTEGER DEFAULT 0,
+        status_chat_id INTEGER,
+        status_message_id INTEGER,
+        created_at INTEGER,
+        updated_at INTEGER
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status)")
+
+def _keyset_indexes(cursor: sqlite3.Cursor):
+    # listings page by sort key instead of OFFSET, these give them a range scan in display order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at, user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_radargame_user_id ON radargame(user_id, id)")
+
+# local calendar day of a unix timestamp, same boundary the status panel always used
+DAY = "date({}, 'unixepoch', 'localtime')"
+
+def _bump_day(column: str, day_expr: str, amount: str = "1") -> str:
+    return (f"INSERT INTO daily_stats (day, {column}) VALUES ({day_expr}, {amount}) "
+            f"ON CONFLICT(day) DO UPDATE SET {column} = {column} + excluded.{column};")
+
+def _stats_tables(cursor: sqlite3.Cursor):
+    # counters kept current by triggers, so the status panel never scans users/radargame
+    cursor.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,
+        new_users INTEGER NOT NULL DEFAULT 0,
+        active_users INTEGER NOT NULL DEFAULT 0,
+        new_accounts INTEGER NOT NULL DEFAULT 0,
+        configs INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+
+    # backfill from the existing rows
+    cursor.execute("""
+    INSERT OR REPLACE INTO stats (key, value)
+    SELECT 'total_users', COUNT(*) FROM users
+    UNION ALL SELECT 'banned_users', COUNT(*) FROM users WHERE banned=1
+    UNION ALL SELECT 'configs_generated', COALESCE(SUM(usage_count), 0) FROM users
+    UNION ALL SELECT 'total_radargame', COUNT(*) FROM radargame
+    """)
+    cursor.execute(f"INSERT OR IGNORE INTO daily_stats (day) SELECT DISTINCT {DAY.format('created_at')} FROM users WHERE created_at IS NOT NULL")
+    cursor.execute(f"INSERT OR IGNORE INTO daily_stats (day) SELECT DISTINCT {DAY.format('last_active')} FROM users WHERE last_active IS NOT NULL")
+    cursor.execute(f"INSERT OR IGNORE INTO daily_stats (day) SELECT DISTINCT {DAY.format('created_at')} FROM radargame WHERE created_at IS NOT NULL")
+    cursor.execute(f"""
+    UPDATE daily_stats SET
+        new_users = (SELECT COUNT(*) FROM users WHERE {DAY.format('created_at')} = daily_stats.day),
+        active_users = (SELECT COUNT(*) FROM users WHERE {DAY.format('last_active')} = daily_stats.day),
+        new_accounts = (SELECT COUNT(*) FROM radargame WHERE {DAY.format('created_at')} = daily_stats.day)
+    """)
+
+    # users
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_insert AFTER INSERT ON users BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'total_users';
+        UPDATE stats SET value = value + 1 WHERE key = 'banned_users' AND NEW.banned = 1;
+        {_bump_day("new_users", DAY.format("NEW.created_at"))}
+        {_bump_day("active_users", DAY.format("NEW.last_active"))}
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_delete AFTER DELETE ON users BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'total_users';
+        UPDATE stats SET value = value - 1 WHERE key = 'banned_users' AND OLD.banned = 1;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_ban AFTER UPDATE OF banned ON users
+    WHEN COALESCE(OLD.banned, 0) != COALESCE(NEW.banned, 0) BEGIN
+        UPDATE stats SET value = value + (CASE WHEN NEW.banned = 1 THEN 1 ELSE -1 END) WHERE key = 'banned_users';
+    END
+    """)
+    # a user counts once per day: only the first last_active of a new day bumps active_users
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_active AFTER UPDATE OF last_active ON users
+    WHEN {DAY.format("NEW.last_active")} IS NOT {DAY.format("OLD.last_active")} BEGIN
+        {_bump_day("active_users", DAY.format("NEW.last_active"))}
+    END
+    """)
+    # usage_count goes up by one per generated config (batched by the write-behind buffer)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_usage AFTER UPDATE OF usage_count ON users
+    WHEN COALESCE(NEW.usage_count, 0) > COALESCE(OLD.usage_count, 0) BEGIN
+        UPDATE stats SET value = value + NEW.usage_count - COALESCE(OLD.usage_count, 0) WHERE key = 'configs_generated';
+        {_bump_day("configs", "date('now', 'localtime')", "NEW.usage_count - COALESCE(OLD.usage_count, 0)")}
+    END
+    """)
+
+    # radargame
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_radargame_insert AFTER INSERT ON radargame BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'total_radargame';
+        {_bump_day("new_accounts", DAY.format("NEW.created_at"))}
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_radargame_delete AFTER DELETE ON radargame BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'total_radargame';
+    END
+    """)
+
+def _persistence_tables(cursor: sqlite3.Cursor):
+    # PTB persistence (core/persistence.py): one row per user_data/chat_data key, JSON values
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS persisted_data (
+        scope TEXT NOT NULL,       -- 'user' or 'chat'
+        owner_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (scope, owner_id, key)
+    ) WITHOUT ROWID
+    """)
+    # only conversations in progress, an ended one is deleted
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS conversations (
+        name TEXT NOT NULL,
+        conv_key TEXT NOT NULL,    -- JSON list, e.g. [chat_id, user_id]
+        state TEXT NOT NULL,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (name, conv_key)
+    ) WITHOUT ROWID
+    """)
+
+def _cache_invalidations(cursor: sqlite3.Cursor):
+    # multi-worker mode (core/cache_bus.py): cache entries another worker must drop, pruned by age
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,        -- 'user', 'reload' or 'admin_panel'
+        key TEXT NOT NULL,
+        origin INTEGER NOT NULL,   -- pid of the publishing worker
+        created_at INTEGER NOT NULL
+    )
+    """)
+
+def _broadcast_runner(cursor: sqlite3.Cursor):
+    # the one task (pid-run) allowed to send a job; a pause/resume/cancel on any worker
+    # changes status or runner and the old task stops at its next batch
+    cursor.execute("ALTER TABLE broadcast_jobs ADD COLUMN runner TEXT")
+
+def _bot_settings(cursor: sqlite3.Cursor):
+    # settings changed at runtime from the admin panel, JSON values
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS bot_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        updated_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+
+MIGRATIONS = [
+    _base_schema,
+    _radargame_token_expiry,
+    _hot_query_indexes,
+    _broadcast_jobs,
+    _keyset_indexes,
+    _stats_tables,
+    _persistence_tables,
+    _cache_invalidations,
+    _broadcast_runner,
+    _bot_settings,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn: sqlite3.Connection) -> int:
+    while True:
+        # IMMEDIATE takes the write lock up front, so two processes never apply the same step
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.execute("COMMIT")
+                return version
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version={version + 1}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
@@ -0,0 +1,139 @@
+import asyncio
+import html
+import json
+import time
+
+from core.config_loader import ADB, CFG, TEXTS
+from core.ratelimit import TokenBucket
+from core.workers import local_share
+
+# Admin panel settings (toggled from the admin panel, kept in the bot_settings table):
+ADMIN_PANEL = {
+    "notify_new_user": True,
+    "notify_new_config": True
+}
+
+async def load_admin_panel():
+    stored = await ADB.get_bot_settings()
+    ADMIN_PANEL.update({key: json.loads(stored[key]) for key in ADMIN_PANEL if key in stored})
+
+async def save_admin_panel():
+    await ADB.set_bot_settings({key: json.dumps(value) for key, value in ADMIN_PANEL.items()})
+
+DEFAULT_NOTIFY = {
+    "digest_interval": 0,   # seconds, 0 = send every event on its own
+    "digest_max_lines": 20,
+    "queue_size": 1000,
+    "rate": 20              # owner messages per second (split between workers)
+}
+NEW_USER, NEW_CONFIG = "new_user", "new_config"
+
+def notify_settings() -> dict:
+    settings = dict(DEFAULT_NOTIFY)
+    settings.update(CFG.get("NOTIFY", {}))
+    return settings
+
+### --- Owner notification queue --- ###
+class OwnerNotifier:
+    def __init__(self):
+        self._queue = None
+        self._task = None
+        self._bot = None
+        self._digest = {NEW_USER: [], NEW_CONFIG: []}
+        self._digest_started = time.monotonic()
+        self._bucket = TokenBucket(notify_settings()["rate"])
+        self.sent = 0
+        self.dropped = 0
+
+    def _enqueue(self, kind: str, event: dict):
+        if not ADMIN_PANEL[f"notify_{kind}"] or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((kind, event))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def new_user(self, user):
+        self._enqueue(NEW_USER, {"user_id": user.id, "fullname": user.full_name, "username": user.username})
+
+    def new_config(self, user, radar_email: str):
+        self._enqueue(NEW_CONFIG, {"user_id": user.id, "fullname": user.full_name, "username": user.username, "radar_email": radar_email})
+
+    def _format_event(self, kind: str, event: dict) -> str:
+        escaped = {key: html.escape(str(value)) if isinstance(value, str) else value for key, value in event.items()}
+        if kind == NEW_CONFIG:
+            return TEXTS["radargame"]["new_config_notify_owner"].format(**escaped)
+        return TEXTS["admin"]["new_user_notify"].format(**escaped)
+
+    def _format_digest(self, kind: str, events: list) -> str:
+        texts = TEXTS["admin"]["notify_digest"]
+        max_lines = notify_settings()["digest_max_lines"]
+        lines = [texts["line"].format(user_id=event["user_id"], fullname=html.escape(event["fullname"] or "-")) for event in events[:max_lines]]
+        if len(events) > max_lines:
+            lines.append(texts["more"].format(count=len(events) - max_lines))
+        minutes = max(1, round((time.monotonic() - self._digest_started) / 60))
+        return texts[kind].format(count=len(events), minutes=minutes, lines="\n".join(lines))
+
+    async def _send(self, text: str):
+        for owner_id in CFG["OWNERS"]:
+            await self._bucket.acquire()
+            try:
+                await self._bot.send_message(chat_id=owner_id, text=text, parse_mode="HTML")
+                self.sent += 1
+            except Exception as e:
+                print(f"Failed to notify owner: {e}")
+
+    async def _flush_digest(self):
+        for kind, events in self._digest.items():
+            if not events:
+                continue
+            self._digest[kind] = []
+            if len(events) == 1:
+                await self._send(self._format_event(kind, events[0]))
+            else:
+                await self._send(self._format_digest(kind, events))
+        self._digest_started = time.monotonic()
+
+    async def _run(self):
+        while True:
+            interval = notify_settings()["digest_interval"]
+            if interval <= 0:
+                kind, event = await self._queue.get()
+                await self._send(self._format_event(kind, event))
+                continue
+
+            # digest mode: collect everything that arrives within the interval
+            deadline = self._digest_started + interval
+            try:
+                kind, event = await asyncio.wait_for(self._queue.get(), timeout=max(0.0, deadline - time.monotonic()))
+                self._digest[kind].append(event)
+            except asyncio.TimeoutError:
+                await self._flush_digest()
+
+    def start(self, bot):
+        self._bot = bot
+        self._bucket = TokenBucket(local_share(notify_settings()["rate"]))
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=notify_settings()["queue_size"])
+        if self._task is None or self._task.done():
+            self._digest_started = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # deliver what is still queued as one digest
+        while self._queue is not None and not self._queue.empty():
+            kind, event = self._queue.get_nowait()
+            self._digest[kind].append(event)
+        try:
+            await asyncio.wait_for(self._flush_digest(), timeout=10)
+        except Exception as e:
+            print(f"Failed to flush owner notifications: {e}")
+
+NOTIFIER = OwnerNotifier()
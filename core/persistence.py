@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from core.config_loader import ADB, CFG
+
+DEFAULT_PERSISTENCE = {
+    "enabled": True,
+    "update_interval": 10,  # seconds between writes of changed user_data / conversations
+    "max_cached": 10000     # users/chats whose data is kept in memory, least recently used go first
+}
+USER, CHAT = "user", "chat"
+FLUSH_ATTEMPTS = 3
+
+def persistence_settings() -> dict:
+    settings = dict(DEFAULT_PERSISTENCE)
+    settings.update(CFG.get("PERSISTENCE", {}))
+    return settings
+
+### --- PTB persistence in the bot DB (per-key rows, loaded per user on first update) --- ###
+class SQLitePersistence(BasePersistence):
+    def __init__(self, update_interval: float = DEFAULT_PERSISTENCE["update_interval"], max_cached: int = DEFAULT_PERSISTENCE["max_cached"]):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+                         update_interval=update_interval)
+        # (scope, id) -> [{key: JSON} as last written, last use]; holds every id refreshed
+        # from the DB in this process and is the base for the dirty-key diff
+        self._tracked = OrderedDict()
+        self.max_cached = max_cached
+        # idle this long before eviction, so no unwritten change is still waiting in PTB
+        self.evict_after = max(60.0, 3 * update_interval)
+        self._evicted = set()  # (scope, id) dropped from memory, PTB's drop_*_data for them must not touch the DB
+        self._application = None
+        self._pending_data = {}           # (scope, id, key) -> JSON, None = delete
+        self._pending_conversations = {}  # (name, JSON key) -> JSON state, None = delete
+        self._commit_task = None
+        self.rows_written = 0
+        self.evictions = 0
+
+    def attach(self, application):
+        # needed to drop evicted user_data/chat_data from the Application as well
+        self._application = application
+
+    # --- change tracking ---
+    def _touch(self, scope: str, owner_id: int, persisted: dict | None = None):
+        entry = self._tracked.get((scope, owner_id))
+        if entry is None:
+            entry = self._tracked[(scope, owner_id)] = [{}, 0.0]
+        if persisted is not None:
+            entry[0] = persisted
+        entry[1] = time.monotonic()
+        self._tracked.move_to_end((scope, owner_id))
+
+    def _evict(self):
+        # least recently used first, and only ids idle for evict_after
+        now = time.monotonic()
+        while len(self._tracked) > self.max_cached:
+            (scope, owner_id), (_, last_used) = next(iter(self._tracked.items()))
+            if now - last_used < self.evict_after:
+                return
+            del self._tracked[(scope, owner_id)]
+            self.evictions += 1
+            if self._application is not None:
+                self._evicted.add((scope, owner_id))
+                if scope == USER:
+                    self._application.drop_user_data(owner_id)
+                else:
+                    self._application.drop_chat_data(owner_id)
+
+    async def _drop(self, scope: str, owner_id: int):
+        if (scope, owner_id) in self._evicted:
+            # an eviction, not a real drop: the DB rows stay. If the id came back before
+            # PTB's next persistence round, PTB skips its pending update, so stage it here
+            self._evicted.discard((scope, owner_id))
+            live = (self._application.user_data if scope == USER else self._application.chat_data).get(owner_id)
+            if live is not None and (scope, owner_id) in self._tracked:
+                self._stage(scope, owner_id, live)
+                await self._commit()
+            return
+        self._tracked.pop((scope, owner_id), None)
+        self._pending_data = {key: value for key, value in self._pending_data.items() if key[:2] != (scope, owner_id)}
+        await ADB.drop_persisted_data(scope, owner_id)
+
+    def _stage(self, scope: str, owner_id: int, data: dict):
+        entry = self._tracked.get((scope, owner_id))
+        old = entry[0] if entry else {}
+        new = {}
+        for key, value in data.items():
+            try:
+                new[str(key)] = json.dumps(value, sort_keys=True)
+            except (TypeError, ValueError):
+                # not JSON, keep it in memory only
+                print(f"Persistence: skipping non-JSON {scope}_data[{key!r}] of {owner_id}")
+        for key, value in new.items():
+            if old.get(key) != value:
+                self._pending_data[(scope, owner_id, key)] = value
+        for key in old.keys() - new.keys():
+            self._pending_data[(scope, owner_id, key)] = None
+        self._touch(scope, owner_id, new)
+
+    async def _commit(self):
+        # PTB calls update_* for every dirty user at once; they share one transaction
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.create_task(self._write_pending())
+        await asyncio.shield(self._commit_task)
+
+    async def _write_pending(self):
+        # let the rest of this update_persistence round stage its changes first
+        await asyncio.sleep(0)
+        data, self._pending_data = self._pending_data, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not data and not conversations:
+            return
+        try:
+            await ADB.apply_persistence_changes(data, conversations)
+        except Exception as e:
+            print(f"Persistence write failed: {e}")
+            # newer changes staged meanwhile win over the ones being put back
+            self._pending_data = {**data, **self._pending_data}
+            self._pending_conversations = {**conversations, **self._pending_conversations}
+            return
+        self.rows_written += len(data) + len(conversations)
+
+    async def _load(self, scope: str, owner_id: int, target: dict):
+        if (scope, owner_id) in self._tracked:
+            self._touch(scope, owner_id)
+            return
+        stored = await ADB.get_persisted_data(scope, owner_id)
+        if (scope, owner_id) in self._tracked:
+            # staged while the query ran
+            self._touch(scope, owner_id)
+            return
+        self._touch(scope, owner_id, dict(stored))
+        # keys set before the first refresh (none in practice) are kept
+        for key, value in stored.items():
+            target.setdefault(key, json.loads(value))
+        self._evict()
+
+    # --- user_data / chat_data: nothing at startup, one small query per id on first use ---
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._load(USER, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._load(CHAT, chat_id, chat_data)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._stage(USER, user_id, data)
+        await self._commit()
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self._stage(CHAT, chat_id, data)
+        await self._commit()
+
+    async def drop_user_data(self, user_id: int):
+        await self._drop(USER, user_id)
+
+    async def drop_chat_data(self, chat_id: int):
+        await self._drop(CHAT, chat_id)
+
+    # --- conversations: only the ones in progress are stored, so loading all is cheap ---
+    async def get_conversations(self, name: str) -> dict:
+        stored = await ADB.get_conversations(name)
+        return {tuple(json.loads(key)): json.loads(state) for key, state in stored.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None):
+        self._pending_conversations[(name, json.dumps(list(key)))] = None if new_state is None else json.dumps(new_state)
+        await self._commit()
+
+    # --- not stored ---
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def flush(self):
+        # called by PTB on shutdown, after the last update_persistence round; a commit
+        # that was already running may have started before the last changes were staged
+        for _ in range(FLUSH_ATTEMPTS):
+            if self._commit_task is not None and not self._commit_task.done():
+                await asyncio.shield(self._commit_task)
+            if not self._pending_data and not self._pending_conversations:
+                return
+            await self._commit()
+        print(f"Persistence: {len(self._pending_data) + len(self._pending_conversations)} changes not written on shutdown")
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._tracked), "evictions": self.evictions, "rows_written": self.rows_written}
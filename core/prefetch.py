@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from core.config_loader import CFG
+from core.radargame_api import get_config
+from core.token_cache import TOKEN_CACHE
+
+DEFAULT_CONFIG_PREFETCH = {
+    "ttl": 120  # seconds a prefetched config waits for the DNS tap
+}
+
+def prefetch_settings() -> dict:
+    settings = dict(DEFAULT_CONFIG_PREFETCH)
+    settings.update(CFG.get("CONFIG_PREFETCH", {}))
+    return settings
+
+def _retrieve(task: asyncio.Task):
+    # nobody may ever await an abandoned prefetch, keep asyncio from warning about it
+    if not task.cancelled():
+        task.exception()
+
+### --- get_config started on the server tap, awaited on the DNS tap --- ###
+class ConfigPrefetcher:
+    def __init__(self):
+        self._tasks = {}  # user_id -> (account username, server_id, started, task)
+        self.hits = 0
+        self.misses = 0
+
+    def _purge(self):
+        cutoff = time.monotonic() - prefetch_settings()["ttl"]
+        for user_id in [user_id for user_id, entry in self._tasks.items() if entry[2] < cutoff]:
+            self._tasks.pop(user_id)[3].cancel()
+
+    def start(self, user_id: int, account, server_id: str):
+        self._purge()
+        previous = self._tasks.pop(user_id, None)
+        if previous:
+            previous[3].cancel()
+        task = asyncio.create_task(TOKEN_CACHE.call(account, get_config, server_id))
+        task.add_done_callback(_retrieve)
+        self._tasks[user_id] = (account["username"], server_id, time.monotonic(), task)
+
+    async def take(self, user_id: int, account, server_id: str):
+        entry = self._tasks.pop(user_id, None)
+        if entry and entry[0] == account["username"] and entry[1] == server_id and time.monotonic() - entry[2] < prefetch_settings()["ttl"]:
+            self.hits += 1
+            return await entry[3]
+        if entry:
+            # another account or server was picked since, or it is too old to trust
+            entry[3].cancel()
+        self.misses += 1
+        return await TOKEN_CACHE.call(account, get_config, server_id)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "pending": len(self._tasks)}
+
+CONFIG_PREFETCH = ConfigPrefetcher()
@@ -0,0 +1,110 @@
+import asyncio
+import functools
+import time
+
+import httpx
+
+from core.http_client import get_http_client, api_base, call_timeout, call_deadline, http_settings, retry_delay
+from core.circuit_breaker import RADARGAME_BREAKER
+from core.metrics import METRICS
+
+# Raised when RadarGame rejects an access token (HTTP 401)
+class TokenExpiredError(Exception):
+    pass
+
+# Raised when RadarGame is down, too slow or the circuit breaker is open
+class ServiceBusyError(Exception):
+    pass
+
+def instrument_api(endpoint: str):
+    # latency + outcome per endpoint; an empty result (None / []) is a rejected
+    # login or a malformed answer and counts as "failed"
+    latency = METRICS.histogram("radargame_api_seconds", "RadarGame API call latency", endpoint=endpoint)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "ok" if result else "failed"
+                return result
+            except TokenExpiredError:
+                outcome = "unauthorized"
+                raise
+            except ServiceBusyError:
+                outcome = "busy"
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+                METRICS.counter("radargame_api_requests_total", "RadarGame API calls by outcome", endpoint=endpoint, outcome=outcome).inc()
+        return wrapper
+    return decorator
+
+async def _request(endpoint: str, method: str, path: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+    # deadline for the whole call, jittered retries for idempotent requests only;
+    # transport errors, timeouts and 5xx count against the circuit breaker
+    if not RADARGAME_BREAKER.allow():
+        raise ServiceBusyError(f"{endpoint}: circuit open")
+    attempts = 1 + (http_settings()["retries"] if idempotent else 0)
+    error = None
+    try:
+        async with asyncio.timeout(call_deadline(endpoint)):
+            for attempt in range(attempts):
+                if attempt:
+                    await asyncio.sleep(retry_delay(attempt))
+                try:
+                    res = await get_http_client().request(method, f"{api_base()}{path}", timeout=call_timeout(endpoint), **kwargs)
+                except httpx.TransportError as e:
+                    error = repr(e)
+                    continue
+                if res.status_code >= 500:
+                    error = f"HTTP {res.status_code}"
+                    continue
+                RADARGAME_BREAKER.record_success()
+                return res
+    except TimeoutError:
+        error = "deadline exceeded"
+    except asyncio.CancelledError:
+        RADARGAME_BREAKER.release()
+        raise
+    RADARGAME_BREAKER.record_failure()
+    raise ServiceBusyError(f"{endpoint}: {error}")
+
+# RadarGame Functions
+@instrument_api("login")
+async def get_token(username, password):
+    # a login is not repeated on its own, it is not known whether the first one got through
+    res = await _request("login", "POST", "/auth/login", json={"username": username, "password": password})
+    try:
+        data = res.json()
+        if not data["isSuccess"]: return None
+        return data["result"]["accessToken"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+@instrument_api("servers")
+async def get_servers(token):
+    res = await _request("servers", "GET", "/user/servers", idempotent=True,
+                         headers={"Authorization": f"Bearer {token}"})
+    if res.status_code == 401:
+        raise TokenExpiredError()
+    try:
+        data = res.json()
+        return data["result"] if data["isSuccess"] else []
+    except (ValueError, KeyError, TypeError):
+        return []
+
+@instrument_api("account")
+async def get_config(token, server_id):
+    res = await _request("account", "GET", "/user/account/getAccount", idempotent=True,
+                         headers={"Authorization": f"Bearer {token}"},
+                         params={"serverId": server_id})
+    if res.status_code == 401:
+        raise TokenExpiredError()
+    try:
+        data = res.json()
+        return data["result"] if data["isSuccess"] else None
+    except (ValueError, KeyError, TypeError):
+        return None
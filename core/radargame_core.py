@@ -1,46 +1,33 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, ReactionTypeEmoji, CopyTextButton
 from telegram.ext import ContextTypes, ConversationHandler
-import requests
+import asyncio
 import random
 import string
-import os
-
-from core.config_loader import DBH, CFG, DNS_LIST, TEXTS
-from core.utils import check_user
-
-# RadarGame Functions
-async def get_token(username, password):
-    try:
-        res = requests.post(f"{CFG["RADARGAME_API_BASE"]}/auth/login", json={"username": username, "password": password})
-        data = res.json()
-        if not data["isSuccess"]: return None
-        return data["result"]["accessToken"]
-    except:
-        return None
-
-async def get_servers(token):
-    try:
-        res = requests.get(f"{CFG["RADARGAME_API_BASE"]}/user/servers", headers={"Authorization": f"Bearer {token}"})
-        data = res.json()
-        return data["result"] if data["isSuccess"] else []
-    except:
-        return []
-
-async def get_config(token, server_id):
-    try:
-        res = requests.get(f"{CFG["RADARGAME_API_BASE"]}/user/account/getAccount",
-                           headers={"Authorization": f"Bearer {token}"},
-                           params={"serverId": server_id})
-        data = res.json()
-        return data["result"] if data["isSuccess"] else None
-    except:
-        return None
+import io
+
+from core.config_loader import ADB, CFG, DNS_LIST, TEXTS
+from core.utils import check_user, encode_cursor, decode_cursor
+from core.radargame_api import get_token, get_servers, ServiceBusyError
+from core.circuit_breaker import RADARGAME_BREAKER
+from core.token_cache import TOKEN_CACHE, token_expiry
+from core.server_cache import SERVER_CACHE
+from core.write_behind import WRITE_BEHIND
+from core.config_archive import CONFIG_ARCHIVE
+from core.notifier import NOTIFIER
+from core.prefetch import CONFIG_PREFETCH
+from core.markup_cache import MARKUPS, back_to_main_markup
+
+async def cancel_tasks(*tasks):
+    # cancel and wait for them, so nothing is left running or logs an unretrieved exception
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 async def generate_random_string(length=8):
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
-async def build_config_file(data):
-    rand = await generate_random_string()
+### --- Render WireGuard config in memory --- ###
+def render_config(data) -> str:
     primary_dns = data.get("primary_dns", "8.8.8.8")
     secondary_dns = data.get("secondary_dns", "1.1.1.1")
     dns_value = ",".join([primary_dns, secondary_dns])
@@ -60,21 +47,31 @@ async def build_config_file(data):
         f"AllowedIPs = {data['allowedIPs']}\n"
         f"PersistentKeepalive = {data['persistentKeepalive']}\n"
     )
-    file_path = f"configs/radar-{rand}.conf"
-    os.makedirs("configs", exist_ok=True)
-    with open(file_path, "w") as f:
-        f.write(content)
-    return file_path
+    return content
+
+async def build_config_file(data):
+    rand = await generate_random_string()
+    filename = f"radar-{rand}.conf"
+    content = render_config(data)
+    CONFIG_ARCHIVE.save(filename, content)
+    return filename, content
 
 # RadarGame account manager
-async def change_radar_account(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1, edit: bool = False):
+ACCOUNTS_PAGE_SIZE = 5
+
+async def change_radar_account(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 1, edit: bool = False, after_id: int | None = None, before_id: int | None = None):
     if not await check_user(update, context):
         return
 
     user_id = update.effective_user.id
-    radargame_account = DBH.get_user_radargame_accounts(user_id)
-
-    if not radargame_account:
+    total = await ADB.count_user_radargame_accounts(user_id)
+    accounts = await ADB.get_radargame_accounts_keyset(user_id, ACCOUNTS_PAGE_SIZE, after_id=after_id, before_id=before_id) if total else []
+    if total and not accounts and after_id:
+        # the last account of this page was removed, show the page before it
+        page -= 1
+        accounts = await ADB.get_radargame_accounts_keyset(user_id, ACCOUNTS_PAGE_SIZE, before_id=after_id + 1)
+
+    if not accounts:
         markup = InlineKeyboardMarkup([
             [InlineKeyboardButton(TEXTS["radargame"]["new_account_button"], callback_data="new_account")],
             [InlineKeyboardButton(TEXTS["backtomain"], callback_data="backtomain")]
@@ -85,29 +82,27 @@ async def change_radar_account(update: Update, context: ContextTypes.DEFAULT_TYP
             await update.effective_chat.send_message(TEXTS["radargame"]["no_account_found"], reply_markup=markup)
         return
 
-    PAGE_SIZE = 5
-    total = len(radargame_account)
-    max_page = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    max_page = (total + ACCOUNTS_PAGE_SIZE - 1) // ACCOUNTS_PAGE_SIZE
     page = max(1, min(page, max_page))
-    start = (page - 1) * PAGE_SIZE
-    end = start + PAGE_SIZE
-    accounts = radargame_account[start:end]
+    # buttons on this page redraw it from just before its first account
+    here = encode_cursor(accounts[0]["id"] - 1)
 
     message = f"<b>👤 اکانت های شما (صفحه {page}/{max_page}):</b>\n\n"
     keyboard = []
     for account in accounts:
+        account_key = encode_cursor(account["id"])
         keyboard.append([
-            InlineKeyboardButton(f"{'🟢' if account["is_active"] else '👤'} {account["username"]}", callback_data=f"set_active:{account["username"]}:{page}")
+            InlineKeyboardButton(f"{'🟢' if account["is_active"] else '👤'} {account["username"]}", callback_data=f"set_active:{account_key}:{page}:{here}")
         ])
         keyboard.append([
-            InlineKeyboardButton("🗑️ حذف", callback_data=f"remove_account:{account["username"]}")
+            InlineKeyboardButton("🗑️ حذف", callback_data=f"remove_account:{account_key}:{page}:{here}")
         ])
 
     nav_row = []
     if page > 1:
-        nav_row.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"change_account:{page-1}"))
+        nav_row.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f"change_account:{page-1}:p:{encode_cursor(accounts[0]["id"])}"))
     if page < max_page:
-        nav_row.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"change_account:{page+1}"))
+        nav_row.append(InlineKeyboardButton("بعدی ➡️", callback_data=f"change_account:{page+1}:n:{encode_cursor(accounts[-1]["id"])}"))
     if nav_row:
         keyboard.append(nav_row)
     keyboard.append([InlineKeyboardButton(TEXTS["radargame"]["new_account_button"], callback_data="new_account")])
@@ -120,6 +115,22 @@ async def change_radar_account(update: Update, context: ContextTypes.DEFAULT_TYP
 
     return
 
+async def callback_account(user_id: int, parts: list):
+    # set_active / remove_account:<id>:<page>:<cursor>; buttons sent before ids were used carry the username
+    if len(parts) == 4:
+        key = decode_cursor(parts[1])
+        return await ADB.get_radargame_account(user_id, key[0]) if key else None
+    for account in await ADB.get_user_radargame_accounts(user_id):
+        if account["username"] == parts[1]:
+            return account
+    return None
+
+def callback_page(parts: list) -> tuple:
+    # (page, after_id) of the listing page an account button was on
+    page = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
+    cursor = decode_cursor(parts[3]) if len(parts) == 4 else None
+    return page, cursor[0] if cursor else None
+
 USERNAME, PASSWORD = range(2)
 async def new_radar_account(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.effective_chat.send_message(TEXTS["radargame"]["cancel_note"])
@@ -145,18 +156,22 @@ async def get_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     login_state_message = await update.effective_chat.send_message("⏳")
 
-    markup = InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["backtomain"], callback_data="backtomain")]])
+    markup = back_to_main_markup()
     
-    if DBH.radargame_username_exists(user_id, username):
-        await login_state_message.edit_text(TEXTS["radargame"]["duplicate_account_error"].format(username=username), reply_markup=markup)
+    try:
+        token = await get_token(username, password)
+    except ServiceBusyError:
+        await login_state_message.edit_text(TEXTS["errors"]["service_busy"], reply_markup=markup)
         return ConversationHandler.END
-
-    token = await get_token(username, password)
     if not token:
         await login_state_message.edit_text(TEXTS["radargame"]["login_fail"], reply_markup=markup)
         return ConversationHandler.END
 
-    DBH.add_radargame_account(user_id, username, password, token)
+    expires_at = token_expiry(token)
+    if not await ADB.add_radargame_account(user_id, username, password, token, expires_at):
+        await login_state_message.edit_text(TEXTS["radargame"]["duplicate_account_error"].format(username=username), reply_markup=markup)
+        return ConversationHandler.END
+    await TOKEN_CACHE.put(user_id, username, token, expires_at, persist=False)
     context.user_data["token"] = token
     await login_state_message.edit_text(TEXTS["radargame"]["login_success"], reply_markup=markup)
     return ConversationHandler.END
@@ -167,36 +182,60 @@ async def new_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     user_id = update.callback_query.from_user.id
-    account = DBH.get_active_radargame_account(user_id)
+    account = await ADB.get_active_radargame_account(user_id)
 
+    if account and RADARGAME_BREAKER.rejecting():
+        # fail fast instead of sending the intro messages for nothing
+        await update.effective_chat.send_message(TEXTS["errors"]["service_busy"])
+        return
     if account:
         context.user_data["username"] = account["username"]
-        context.user_data["token"] = await get_token(account["username"], account["password"])
-        if context.user_data["token"]:
+        # login and the server list load while the intro messages go out
+        token_task = asyncio.create_task(TOKEN_CACHE.get(account))
+        servers_task = asyncio.create_task(SERVER_CACHE.get(lambda: TOKEN_CACHE.call(account, get_servers)))
+        try:
             login_success_message = await update.effective_chat.send_message(TEXTS["radargame"]["login_success"])
-            await context.bot.setMessageReaction(user_id, login_success_message.id, reaction=ReactionTypeEmoji('⚡'))
-            await update.effective_chat.send_message(TEXTS["radargame"]["active_account_info"].format(user_id=user_id, email=account["username"]), reply_to_message_id=login_success_message.id, parse_mode="HTML")
-            return await show_servers(update, context)
+            await asyncio.gather(
+                context.bot.setMessageReaction(user_id, login_success_message.id, reaction=ReactionTypeEmoji('⚡')),
+                update.effective_chat.send_message(TEXTS["radargame"]["active_account_info"].format(user_id=user_id, email=account["username"]), reply_to_message_id=login_success_message.id, parse_mode="HTML")
+            )
+            context.user_data["token"] = await token_task
+        except ServiceBusyError:
+            await cancel_tasks(servers_task)
+            await login_success_message.edit_text(TEXTS["errors"]["service_busy"])
+            return
+        except BaseException:
+            await cancel_tasks(token_task, servers_task)
+            raise
+        if not context.user_data["token"]:
+            await cancel_tasks(servers_task)
+            await login_success_message.edit_text(TEXTS["radargame"]["login_fail"])
+            return
+        return await show_servers(update, context, servers_task)
     else:
         await update.effective_chat.send_message(TEXTS["radargame"]["add_account_warning"], reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(TEXTS["main_menu"]["buttons"]["change_account"], callback_data="change_account")]]), parse_mode="HTML")
         return
 
-async def show_servers(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    servers = await get_servers(context.user_data["token"])
+async def show_servers(update: Update, context: ContextTypes.DEFAULT_TYPE, servers_task):
+    # server list is the same for everyone, so it is shared across users (see core/server_cache.py)
+    try:
+        servers, markup = await servers_task
+    except ServiceBusyError:
+        await update.effective_chat.send_message(TEXTS["errors"]["service_busy"])
+        return ConversationHandler.END
     if not servers:
         await update.effective_chat.send_message(TEXTS["radargame"]["no_server"])
         return ConversationHandler.END
 
-    # Sort servers by loadPercentage (ascending)
-    servers.sort(key=lambda server: server.get("loadPercentage", 100))
-
-    keyboard = [
-        [InlineKeyboardButton(TEXTS["radargame"]["server_button_format"].format(location=server['location'], load=server['loadPercentage']), callback_data=f"server_{str(server['id'])}")]
-        for server in servers
-    ]
-    await update.effective_chat.send_message(TEXTS["radargame"]["choose_server"], reply_markup=InlineKeyboardMarkup(keyboard))
+    await update.effective_chat.send_message(TEXTS["radargame"]["choose_server"], reply_markup=markup)
     return ConversationHandler.END
 
+def dns_keyboard():
+    return MARKUPS.get("dns", lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton(dns["name"], callback_data=f"dns_{idx}")]
+        for idx, dns in enumerate(DNS_LIST)
+    ]))
+
 ### --- RadarGame Callbacks --- ###
 async def radargame_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_user(update, context):
@@ -221,57 +260,51 @@ async def radargame_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE
             await query.edit_message_text(TEXTS["radargame"]["cant_process_dns_selection"])
             return
 
-        creds = DBH.get_active_radargame_account(query.from_user.id)
+        creds = await ADB.get_active_radargame_account(query.from_user.id)
         if not creds:
             await query.edit_message_text(TEXTS["errors"]["unexpected_error"])
             return
 
         server_id = context.user_data.get("server_id")
         username = context.user_data.get("username")
-        token = context.user_data.get("token")
-        config = await get_config(token, server_id)
+        # usually already fetched while the DNS list was on screen
+        try:
+            config = await CONFIG_PREFETCH.take(user_id, creds, server_id)
+        except ServiceBusyError:
+            await query.edit_message_text(TEXTS["errors"]["service_busy"])
+            return
         if not config:
             await query.edit_message_text(TEXTS["errors"]["unexpected_error"])
             return
 
         config["primary_dns"] = selected_dns['primary']
         config["secondary_dns"] = selected_dns['secondary']
-        file_path = await build_config_file(config)
+        filename, config_text = await build_config_file(config)
         await query.edit_message_text(TEXTS["radargame"]["config_saved"])
 
         # Send config as text message
-        with open(file_path, "r", encoding="utf-8") as f:
-            config_text = f.read()
         await query.message.reply_text(f"<pre>{config_text}</pre>", parse_mode="HTML")
 
         # Send config as file
-        await query.message.reply_document(InputFile(open(file_path, "rb")))
+        await query.message.reply_document(InputFile(io.BytesIO(config_text.encode("utf-8")), filename=filename))
 
         # Warning text
         await query.message.reply_text(TEXTS["radargame"]["warning_text_1"], parse_mode="HTML")
+        WRITE_BEHIND.add_usage(user_id)
 
-        # Notify owner
-        for owner_id in CFG["OWNERS"]:
-            try:
-                await context.bot.send_message(text=TEXTS["radargame"]["new_config_notify_owner"].format(user_id=query.from_user.id, fullname=query.from_user.full_name, username=query.from_user.username, radar_email=username),
-                                               chat_id=owner_id, parse_mode="HTML")
-            except Exception as e:
-                print(f"Failed to notify owner: {e}")
+        # Notify owner (queued, sent in the background)
+        NOTIFIER.new_config(query.from_user, username)
         return
 
     elif data.startswith("server_"):
         server_id = str(data.split("server_")[1])
         context.user_data["server_id"] = server_id
+        creds = await ADB.get_active_radargame_account(user_id)
+        if creds:
+            CONFIG_PREFETCH.start(user_id, creds, server_id)
         
         try:
-            keyboard = [
-                [InlineKeyboardButton(
-                    dns["name"], 
-                    callback_data=f"dns_{idx}"
-                )]
-                for idx, dns in enumerate(DNS_LIST)
-            ]
-            await query.edit_message_text(TEXTS["radargame"]["dns_selection"], reply_markup=InlineKeyboardMarkup(keyboard))
+            await query.edit_message_text(TEXTS["radargame"]["dns_selection"], reply_markup=dns_keyboard())
         except Exception as e:
             print(f"Error loading DNS config: {e}")
             await query.edit_message_text(TEXTS["radargame"]["cant_load_dns_list"])
@@ -279,35 +312,45 @@ async def radargame_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     elif data.startswith("set_active"):
         parts = data.split(":")
-        if len(parts) < 2:
+        account = await callback_account(user_id, parts) if len(parts) > 1 else None
+        if not account:
             await query.answer(TEXTS["radargame"]["change_account"]["error"], show_alert=True)
             return
-        account_username = str(parts[1])
-        page = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
-        status = DBH.set_active_radargame(user_id, account_username)
+        page, after_id = callback_page(parts)
+        status = await ADB.set_active_radargame(user_id, account["username"])
         if status:
             await query.answer(TEXTS["radargame"]["change_account"]["success"], show_alert=True)
         else:
             await query.answer(TEXTS["radargame"]["change_account"]["error"], show_alert=True)
-        await change_radar_account(update, context, page=page, edit=True)
+        await change_radar_account(update, context, page=page, edit=True, after_id=after_id)
         return
 
     elif data.startswith("change_account"):
+        # change_account[:<page>:n|p:<account id>]
         parts = data.split(":")
         page = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
-        await change_radar_account(update, context, page=page, edit=True)
+        cursor = decode_cursor(parts[3]) if len(parts) > 3 else None
+        if cursor:
+            await change_radar_account(update, context, page=page, edit=True,
+                                       after_id=cursor[0] if parts[2] == "n" else None,
+                                       before_id=cursor[0] if parts[2] == "p" else None)
+        else:
+            await change_radar_account(update, context, edit=True)
         return
 
     elif data.startswith("remove_account:"):
         parts = data.split(":")
-        if len(parts) < 2:
+        account = await callback_account(user_id, parts)
+        if not account:
             await query.answer(TEXTS["radargame"]["remove_account"]["error"], show_alert=True)
+            await change_radar_account(update, context, edit=True)
             return
-        account_username = str(parts[1])
-        removed = DBH.delete_radargame_account(user_id, account_username)
+        page, after_id = callback_page(parts)
+        removed = await ADB.delete_radargame_account(user_id, account["username"])
+        TOKEN_CACHE.invalidate(user_id, account["username"])
         if removed:
             await query.answer(TEXTS["radargame"]["remove_account"]["success"], show_alert=True)
         else:
             await query.answer(TEXTS["radargame"]["remove_account"]["error"], show_alert=True)
-        await change_radar_account(update, context, page=1, edit=True)
+        await change_radar_account(update, context, page=page, edit=True, after_id=after_id)
         return
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from core.cache import LRUCache
+
+### --- Token bucket --- ###
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate                    # tokens per second
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        # seconds until `tokens` would be available
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, (tokens - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+        return max(wait, self.blocked_until - now)
+
+    async def acquire(self, tokens: float = 1.0):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(max(self.delay(tokens), 0.001))
+
+    def block(self, seconds: float):
+        # e.g. Telegram RetryAfter: nobody gets a token until it has passed
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+### --- One token bucket per key (user id, chat id, ...) --- ###
+class KeyedTokenBuckets:
+    def __init__(self, rate: float, capacity: float | None = None, maxsize: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = LRUCache(maxsize=maxsize)
+
+    def get(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+            self._buckets.set(key, bucket)
+        return bucket
+
+    def try_acquire(self, key, tokens: float = 1.0) -> bool:
+        return self.get(key).try_acquire(tokens)
+
+    async def acquire(self, key, tokens: float = 1.0):
+        await self.get(key).acquire(tokens)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from core.config_loader import CFG, TEXTS
+
+DEFAULT_SERVER_CACHE = {
+    "ttl": 10,
+    "max_stale": 120
+}
+
+### --- Build server picker keyboard --- ###
+def build_servers_keyboard(servers) -> InlineKeyboardMarkup:
+    button_format = TEXTS["radargame"]["server_button_format"]
+    keyboard = [
+        [InlineKeyboardButton(button_format.format(location=server['location'], load=server['loadPercentage']), callback_data=f"server_{str(server['id'])}")]
+        for server in servers
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+### --- Process-wide server list cache (stale-while-revalidate) --- ###
+class ServerListCache:
+    def __init__(self):
+        self._servers = None
+        self._markup = None
+        self._markup_format = None
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _settings(self) -> dict:
+        settings = dict(DEFAULT_SERVER_CACHE)
+        settings.update(CFG.get("SERVER_CACHE", {}))
+        return settings
+
+    def _store(self, servers):
+        # Sort servers by loadPercentage (ascending)
+        self._servers = sorted(servers, key=lambda server: server.get("loadPercentage", 100))
+        self._markup = None
+        self._fetched_at = time.monotonic()
+
+    async def _refresh(self, fetch):
+        servers = await fetch()
+        if servers:
+            self._store(servers)
+        return servers
+
+    async def _background_refresh(self, fetch):
+        try:
+            async with self._lock:
+                await self._refresh(fetch)
+        except Exception as e:
+            print(f"Server list refresh failed: {e}")
+
+    def _result(self):
+        button_format = TEXTS["radargame"]["server_button_format"]
+        if self._markup is None or self._markup_format != button_format:
+            self._markup = build_servers_keyboard(self._servers)
+            self._markup_format = button_format
+        return self._servers, self._markup
+
+    async def get(self, fetch):
+        # fetch: coroutine function returning the raw server list
+        settings = self._settings()
+        age = time.monotonic() - self._fetched_at
+
+        if self._servers and age < settings["ttl"]:
+            self.hits += 1
+            return self._result()
+
+        if self._servers and age < settings["max_stale"]:
+            self.stale_hits += 1
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._background_refresh(fetch))
+            return self._result()
+
+        async with self._lock:
+            # a concurrent caller may have refreshed while we waited
+            if self._servers and time.monotonic() - self._fetched_at < settings["ttl"]:
+                self.hits += 1
+                return self._result()
+            self.misses += 1
+            if not await self._refresh(fetch):
+                return [], None
+        return self._result()
+
+    def invalidate(self):
+        self._servers = None
+        self._markup = None
+        self._fetched_at = 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+SERVER_CACHE = ServerListCache()
@@ -0,0 +1,134 @@
+import asyncio
+import base64
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from core.config_loader import ADB, CFG
+from core.radargame_api import get_token, TokenExpiredError
+
+# Used when the access token carries no readable "exp" claim
+DEFAULT_TOKEN_TTL = 3600
+# Refresh a bit before the upstream expiry
+EXPIRY_MARGIN = 60
+# Seconds between sweeps of expired tokens
+PRUNE_INTERVAL = 300
+
+### --- Token expiry --- ###
+def token_expiry(token: str, now: Optional[int] = None) -> int:
+    now = now or int(time.time())
+    ttl = CFG.get("TOKEN_CACHE", {}).get("default_ttl", DEFAULT_TOKEN_TTL)
+    try:
+        # JWT: header.payload.signature
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = int(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        return exp - EXPIRY_MARGIN
+    except Exception:
+        return now + ttl - EXPIRY_MARGIN
+
+### --- Access token cache (memory + radargame table) --- ###
+class TokenCache:
+    def __init__(self):
+        self._tokens = {}  # (user_id, account_username) -> (token, expires_at)
+        self._locks = {}   # key -> [lock, tasks holding or waiting on it], dropped when that is 0
+        self._last_prune = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @asynccontextmanager
+    async def _locked(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def _prune(self, now: int):
+        if time.monotonic() - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = time.monotonic()
+        # keys someone is logging in for keep their (possibly "rejected") entry
+        for key in [key for key, (_, expires_at) in self._tokens.items() if expires_at <= now and key not in self._locks]:
+            del self._tokens[key]
+
+    def _cached(self, key, account, now: int) -> Optional[str]:
+        cached = self._tokens.get(key)
+        if cached is None and account["token"] and (account["token_expires_at"] or 0) > now:
+            # warm the memory cache from the DB row
+            cached = self._tokens[key] = (account["token"], account["token_expires_at"])
+        if cached and cached[1] > now:
+            return cached[0]
+        return None
+
+    async def put(self, user_id: int, account_username: str, token: str, expires_at: Optional[int] = None, persist: bool = True):
+        expires_at = expires_at or token_expiry(token)
+        self._tokens[(user_id, account_username)] = (token, expires_at)
+        if persist:
+            await ADB.set_radargame_token(user_id, account_username, token, expires_at)
+
+    def invalidate(self, user_id: int, account_username: Optional[str] = None):
+        for key in list(self._tokens):
+            if key[0] == user_id and (account_username is None or key[1] == account_username):
+                self._tokens.pop(key, None)
+
+    async def get(self, account, rejected: Optional[str] = None) -> Optional[str]:
+        key = (account["user_id"], account["username"])
+        self._prune(int(time.time()))
+        if rejected:
+            # drop the token RadarGame answered with 401
+            cached = self._tokens.get(key)
+            if cached is None or cached[0] == rejected:
+                self._tokens[key] = (rejected, 0)
+        else:
+            token = self._cached(key, account, int(time.time()))
+            if token:
+                self.hits += 1
+                return token
+
+        async with self._locked(key):
+            # another task may have logged in while we waited
+            token = self._cached(key, account, int(time.time()))
+            if token:
+                self.hits += 1
+                return token
+
+            self.misses += 1
+            if rejected:
+                self.refreshes += 1
+            token = await get_token(account["username"], account["password"])
+            if not token:
+                self._tokens.pop(key, None)
+                await ADB.set_radargame_token(key[0], key[1], None, None)
+                return None
+            await self.put(key[0], key[1], token)
+            return token
+
+    async def call(self, account, func, *args, **kwargs):
+        # run func(token, ...) and log in again once if the token was rejected
+        token = await self.get(account)
+        if not token:
+            return None
+        try:
+            return await func(token, *args, **kwargs)
+        except TokenExpiredError:
+            token = await self.get(account, rejected=token)
+            if not token:
+                return None
+            try:
+                return await func(token, *args, **kwargs)
+            except TokenExpiredError:
+                return None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes, "size": len(self._tokens), "locks": len(self._locks)}
+
+TOKEN_CACHE = TokenCache()
@@ -0,0 +1,71 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from core.inflight import INFLIGHT
+
+DEFAULT_CONCURRENT_UPDATES = 64
+
+def update_key(update) -> int | None:
+    # updates of the same user (or chat, for channel posts) are never processed in parallel
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+### --- Concurrent update processing with per-user ordering --- ###
+# PTB's process_update (final) takes its own semaphore and then calls
+# do_process_update. That semaphore only bounds how many updates are admitted;
+# the configured concurrency is a second semaphore taken after the user's lock,
+# so one busy user queues behind itself instead of filling every slot.
+ADMITTED_PER_SLOT = 16
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = DEFAULT_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates * ADMITTED_PER_SLOT)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}  # key -> [asyncio.Lock, number of updates holding or waiting for it]
+
+    async def do_process_update(self, update, coroutine):
+        # repeated taps of an expensive button are dropped on arrival, not after
+        # they have waited for the first tap to finish
+        operation = INFLIGHT.operation(update)
+        if operation is not None:
+            if not INFLIGHT.claim(operation):
+                coroutine.close()
+                await INFLIGHT.answer_duplicate(update)
+                return
+            try:
+                await self._process_in_order(update, coroutine)
+            finally:
+                INFLIGHT.release(operation)
+            return
+        await self._process_in_order(update, coroutine)
+
+    async def _process_in_order(self, update, coroutine):
+        key = update_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
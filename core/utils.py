@@ -1,6 +1,6 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from telegram.error import Forbidden, BadRequest
+from telegram.error import Forbidden
 
 import random
 import string
@@ -8,13 +8,39 @@ import time
 import jdatetime
 from datetime import timezone, timedelta
 
-from core.config_loader import DBH, CFG, TEXTS
+from core.config_loader import ADB, TEXTS, config_snapshot
+from core.write_behind import WRITE_BEHIND
+from core.cache_bus import CACHE_BUS
+from core.notifier import NOTIFIER
+from core.membership import is_member_cached, bot_chat_status, BOT_NOT_JOINED, BOT_NO_ACCESS
 
 ### --- Generate Hash --- ###
 def gen_hash(n: int = 12) -> str:
     alphabet = string.ascii_letters + string.digits
     return ''.join(random.choice(alphabet) for _ in range(n))
 
+### --- Compact pagination cursors (callback_data is limited to 64 bytes) --- ###
+BASE36 = string.digits + string.ascii_lowercase
+
+def to_base36(n: int) -> str:
+    if n < 0:
+        return "-" + to_base36(-n)
+    digits = ""
+    while True:
+        n, rem = divmod(n, 36)
+        digits = BASE36[rem] + digits
+        if n == 0:
+            return digits
+
+def encode_cursor(*values: int) -> str:
+    return ".".join(to_base36(value) for value in values)
+
+def decode_cursor(token: str):
+    try:
+        return tuple(int(part, 36) for part in token.split("."))
+    except ValueError:
+        return None
+
 ### --- Humanize time --- ###
 def human_ago(seconds: int) -> str:
     if seconds < 60:
@@ -60,27 +86,39 @@ def get_tehran_shamsi_datetime() -> str:
     return to_persian_digits(date_str)
 
 ### --- Check is user admin or not --- ###
-def is_admin(user_id: int) -> bool:
-    # Check ban status
-    row = DBH.get_user(user_id)
-    if row and row["banned"]:
+async def is_admin(user_id: int) -> bool:
+    # Check role (precomputed in the config snapshot)
+    if user_id not in config_snapshot().admins:
         return False
 
-    # Check role
-    return user_id in set(CFG.get("ADMINS", []) + CFG.get("OWNERS", []))
+    # Check ban status
+    row = await ADB.get_user(user_id)
+    return not (row and row["banned"])
 
 ### --- Check is user owner or not --- ###
-def is_owner(user_id: int) -> bool:
-    # Check ban status
-    row = DBH.get_user(user_id)
-    if row and row["banned"]:
+async def is_owner(user_id: int) -> bool:
+    # Check role (precomputed in the config snapshot)
+    if user_id not in config_snapshot().owners:
         return False
 
-    # Check role
-    return user_id in set(CFG.get("OWNERS", []))
+    # Check ban status
+    row = await ADB.get_user(user_id)
+    return not (row and row["banned"])
+
+### --- Request-scoped user row (loaded at most once per update) --- ###
+async def get_update_user(update: Update, context: ContextTypes.DEFAULT_TYPE = None):
+    user = update.effective_user
+    if user is None:
+        return None
+    row = getattr(context, "user_row", None) if context is not None else None
+    if row is None or row["user_id"] != user.id:
+        row = await ADB.get_user(user.id)
+        if context is not None and row is not None:
+            context.user_row = row
+    return row
 
 ### --- create or update user --- ###
-async def ensure_user(update: Update, update_last_active: bool = True) -> int:
+async def ensure_user(update: Update, context: ContextTypes.DEFAULT_TYPE = None, update_last_active: bool = True) -> int:
     user = update.effective_user
 
     if user is None:
@@ -88,7 +126,7 @@ async def ensure_user(update: Update, update_last_active: bool = True) -> int:
 
     full_name = (user.full_name or "").strip()
     username = user.username
-    db_user = DBH.get_user(user.id)
+    db_user = await get_update_user(update, context)
     if not db_user:
         # first-time: new user_hash
         user_hash = gen_hash(12)
@@ -97,20 +135,35 @@ async def ensure_user(update: Update, update_last_active: bool = True) -> int:
         user_hash = db_user["user_hash"]
         is_new = False
 
+    if db_user and db_user["blocked"]:
+        # user is back, include them in broadcasts again
+        await ADB.set_blocked([user.id], False)
+        await CACHE_BUS.publish_user(user.id)
+
     now = now_ts() if update_last_active else (db_user["last_active"] if db_user else now_ts())
+    if db_user and db_user["username"] == username and db_user["full_name"] == full_name:
+        # only last_active changed, let the write-behind buffer batch it
+        if update_last_active:
+            WRITE_BEHIND.touch(user.id, now)
+            if context is not None:
+                context.user_row = dict(db_user, last_active=now)
+        return 0
+
     try:
-        DBH.upsert_user(user.id, username, full_name, user_hash, now)
+        row = await ADB.upsert_user(user.id, username, full_name, user_hash, now)
     except Exception:
         return 2  # error
+    if context is not None:
+        context.user_row = row
 
     return 1 if is_new else 0
 
 ### --- Check is user banned or not --- ###
-async def banned_guard(update: Update) -> bool:
+async def banned_guard(update: Update, context: ContextTypes.DEFAULT_TYPE = None) -> bool:
     user = update.effective_user
     if not user:
         return False
-    row = DBH.get_user(user.id)
+    row = await get_update_user(update, context)
     if row and row["banned"]:
         if update.callback_query:
             await update.callback_query.answer(TEXTS["errors"]["banned"])
@@ -123,37 +176,32 @@ async def banned_guard(update: Update) -> bool:
 reported_missing_chats = set()
 
 async def is_user_joined(bot, chat_id, user_id):
-    try:
-        member = await bot.get_chat_member(chat_id, user_id)
-        return member.status in ["member", "administrator", "creator"]
-    except Forbidden:
-        # Bot cannot access member info (maybe not an admin in channel/group)
-        return False
+    return await is_member_cached(bot, chat_id, user_id)
     
 async def check_required_chats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     not_joined_user = []
+    # one snapshot for the whole check, a reload halfway through cannot mix chat lists
+    config = config_snapshot()
 
-    for item in CFG["REQUIRED_CHATS"]:
+    for item in config.required_chats:
         title = item["title"]
         join_link = item["join_link"]
         chat_id = item["chat_id"]
 
-
-        try:
-            bot_member = await context.bot.get_chat_member(chat_id, context.bot.id)
-            if bot_member.status in ["left", "kicked"]:
-                if chat_id not in reported_missing_chats:
-                    for admin_id in CFG["OWNERS"]:
-                        await context.bot.send_message(
-                            admin_id,
-                            text=TEXTS["required_chat"]["bot_not_joined"].format(chat_id=chat_id, title=title)
-                        )
-                    reported_missing_chats.add(chat_id)
-                return True
-        except BadRequest:
+        bot_status = await bot_chat_status(context.bot, chat_id)
+        if bot_status == BOT_NOT_JOINED:
+            if chat_id not in reported_missing_chats:
+                for admin_id in config.owners:
+                    await context.bot.send_message(
+                        admin_id,
+                        text=TEXTS["required_chat"]["bot_not_joined"].format(chat_id=chat_id, title=title)
+                    )
+                reported_missing_chats.add(chat_id)
+            return True
+        elif bot_status == BOT_NO_ACCESS:
             if chat_id not in reported_missing_chats:
-                for admin_id in CFG["OWNERS"]:
+                for admin_id in config.owners:
                     await context.bot.send_message(
                         admin_id,
                         text=TEXTS["required_chat"]["bot_no_access"].format(chat_id=chat_id, title=title)
@@ -181,9 +229,10 @@ async def check_required_chats(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def check_user(update: Update, context: ContextTypes.DEFAULT_TYPE, check_force_join: bool=True, check_ban: bool=True, check_user_db: bool=True):
     if check_user_db:
-        await ensure_user(update)
+        if await ensure_user(update, context) == 1:
+            NOTIFIER.new_user(update.effective_user)
     if check_ban:
-        if not await banned_guard(update):
+        if not await banned_guard(update, context):
             return False
     if check_force_join:
         if not await check_required_chats(update, context):
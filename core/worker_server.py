@@ -0,0 +1,61 @@
+import asyncio
+import json
+import signal
+from pathlib import Path
+
+from telegram import Update
+from telegram.ext import Application
+
+from core.workers import ACK, read_frame
+
+### --- Worker side of the front -> worker IPC --- ###
+async def _handle(app: Application, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # updates arrive in the order Telegram sent them; PerUserUpdateProcessor keeps each user's in order
+    try:
+        while True:
+            body = await read_frame(reader)
+            try:
+                update = Update.de_json(json.loads(body), app.bot)
+            except (ValueError, KeyError, TypeError) as e:
+                update = None
+                print(f"Worker: dropping malformed update: {e}")
+            if update is not None:
+                await app.update_queue.put(update)
+            # the ACK means "queued", the front answers Telegram with 200 after it
+            writer.write(ACK)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve_worker(app: Application, path: Path):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # the same lifecycle run_polling / run_webhook go through, minus the update source
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    server = await asyncio.start_unix_server(lambda reader, writer: _handle(app, reader, writer), str(path))
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        path.unlink(missing_ok=True)
+        # updates already queued are still handled before stop() returns
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+def run_worker(app: Application, path: Path):
+    asyncio.run(serve_worker(app, path))
@@ -0,0 +1,284 @@
+import asyncio
+import collections
+import json
+import signal
+import sys
+from pathlib import Path
+
+# the front process (front.py) only uses this module and the standard library,
+# no PTB and no DB, so settings are read from the config dict it is given
+
+DEFAULT_WEBHOOK = {
+    "enabled": False,
+    "listen": "0.0.0.0",
+    "port": 8443,
+    "path": "telegram",
+    "url": "",           # public base url Telegram posts to, e.g. https://bot.example.com
+    "secret_token": "",
+    "max_connections": 40
+}
+
+DEFAULT_WORKERS = {
+    "count": 2,             # bot processes behind the front, each owns the users hashed to it
+                            # and enforces 1/count of the bot-wide rate limits (local_share)
+    "socket_dir": "run",    # front -> worker IPC, worker-<i>.sock
+    "ack_timeout": 10,      # seconds for a worker to queue an update before Telegram gets a 503
+    "start_timeout": 60,    # seconds to wait for every worker socket at startup
+    "restart_delay": 1      # seconds before a dead worker is started again
+}
+
+MAX_UPDATE_SIZE = 1 << 20
+ACK = b"\x01"
+
+WORKER_INDEX = None  # set in worker processes, None in single-process mode
+WORKER_COUNT = 1
+
+def webhook_settings(cfg) -> dict:
+    settings = dict(DEFAULT_WEBHOOK)
+    settings.update(cfg.get("WEBHOOK", {}))
+    return settings
+
+def workers_settings(cfg) -> dict:
+    settings = dict(DEFAULT_WORKERS)
+    settings.update(cfg.get("WORKERS", {}))
+    return settings
+
+def set_worker(index: int, count: int):
+    global WORKER_INDEX, WORKER_COUNT
+    WORKER_INDEX, WORKER_COUNT = index, max(1, count)
+
+def current_worker() -> int | None:
+    return WORKER_INDEX
+
+def is_primary() -> bool:
+    # the single process, or worker 0: runs the jobs that must not run once per worker
+    return WORKER_INDEX in (None, 0)
+
+def local_share(limit: float) -> float:
+    # bot-wide limits (global rate limit buckets, broadcast and owner notification
+    # rates) are enforced per process, each worker gets an equal part of them;
+    # per-user limits need no split, a user's updates all go to one worker
+    return limit / WORKER_COUNT
+
+def socket_path(settings: dict, index: int) -> Path:
+    return Path(settings["socket_dir"]) / f"worker-{index}.sock"
+
+### --- Routing: every update of a user goes to the same worker --- ###
+# membership changes: `from` is whoever made the change, the member's own
+# worker holds the MEMBER_CACHE entry that has to follow it
+MEMBER_UPDATES = ("chat_member", "my_chat_member")
+
+def route_key(update: dict) -> int:
+    # the raw-JSON twin of PTB's effective_user, falling back to the chat
+    # (channel posts, chat boosts); same user -> same worker -> same order,
+    # same conversation state and same in-memory caches
+    for field, value in update.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        if field in MEMBER_UPDATES:
+            user = (value.get("new_chat_member") or {}).get("user") or value.get("from")
+        else:
+            user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+def worker_for(update: dict, count: int) -> int:
+    return route_key(update) % count
+
+### --- Framing: 4-byte big-endian length + update JSON, one ACK byte back --- ###
+def write_frame(writer: asyncio.StreamWriter, body: bytes):
+    writer.write(len(body).to_bytes(4, "big") + body)
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    size = int.from_bytes(await reader.readexactly(4), "big")
+    return await reader.readexactly(size)
+
+### --- Front side: one connection per worker, acks come back in send order --- ###
+class WorkerLink:
+    def __init__(self, index: int, path: Path, ack_timeout: float):
+        self.index = index
+        self.path = path
+        self.ack_timeout = ack_timeout
+        self._writer = None
+        self._acks = None
+        self._ack_task = None
+        self._lock = asyncio.Lock()
+        self.sent = 0
+
+    async def _connect(self):
+        reader, self._writer = await asyncio.open_unix_connection(str(self.path))
+        # a new queue per connection, the old reader task fails only its own futures
+        self._acks = collections.deque()
+        self._ack_task = asyncio.create_task(self._read_acks(reader, self._writer, self._acks))
+
+    async def _read_acks(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, acks: collections.deque):
+        try:
+            while True:
+                await reader.readexactly(1)
+                future = acks.popleft()
+                if not future.done():
+                    future.set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError):
+            pass
+        # the next send reconnects (a restarted worker listens on the same path)
+        writer.close()
+        while acks:
+            future = acks.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"worker {self.index} disconnected"))
+
+    async def send(self, body: bytes):
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+            future = asyncio.get_running_loop().create_future()
+            self._acks.append(future)
+            write_frame(self._writer, body)
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                self._writer.close()
+                raise
+        await asyncio.wait_for(future, self.ack_timeout)
+        self.sent += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+class FrontServer:
+    # minimal HTTP/1.1 (keep-alive, Content-Length bodies) for Telegram's webhook POSTs
+    def __init__(self, webhook: dict, settings: dict):
+        self.path = "/" + webhook["path"].strip("/")
+        self.secret = webhook["secret_token"]
+        self.links = [WorkerLink(i, socket_path(settings, i), settings["ack_timeout"]) for i in range(settings["count"])]
+        self._server = None
+        self.rejected = 0
+
+    async def _dispatch(self, method: str, target: str, headers: dict, body: bytes) -> str:
+        if method != "POST" or target.split("?")[0].rstrip("/") != self.path:
+            return "404 Not Found"
+        if self.secret and headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            return "403 Forbidden"
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return "400 Bad Request"
+        if not isinstance(update, dict):
+            return "400 Bad Request"
+        link = self.links[worker_for(update, len(self.links))]
+        try:
+            await link.send(body)
+        except (OSError, asyncio.TimeoutError) as e:
+            # Telegram retries the update later, in order
+            self.rejected += 1
+            print(f"Front: worker {link.index} unavailable: {e!r}")
+            return "503 Service Unavailable"
+        return "200 OK"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                method, target = (head[0].split(" ") + ["", ""])[:2]
+                headers = {}
+                for line in head[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_UPDATE_SIZE:
+                    writer.write(b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    await writer.drain()
+                    return
+                body = await reader.readexactly(length)
+                status = await self._dispatch(method, target, headers, body)
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for link in self.links:
+            link.close()
+
+### --- Worker processes: started by the front, restarted when they die --- ###
+class WorkerSupervisor:
+    def __init__(self, command: list, settings: dict):
+        self.command = command  # + worker index
+        self.settings = settings
+        self.processes = {}
+        self.restarts = 0
+        self._tasks = []
+        self._stopping = False
+
+    async def _keep_running(self, index: int):
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(*self.command, str(index))
+            self.processes[index] = process
+            code = await process.wait()
+            if self._stopping:
+                return
+            self.restarts += 1
+            print(f"Front: worker {index} exited with code {code}, restarting")
+            await asyncio.sleep(self.settings["restart_delay"])
+
+    async def start(self):
+        Path(self.settings["socket_dir"]).mkdir(parents=True, exist_ok=True)
+        for index in range(self.settings["count"]):
+            # a socket left by an earlier run would look like a ready worker
+            socket_path(self.settings, index).unlink(missing_ok=True)
+            self._tasks.append(asyncio.create_task(self._keep_running(index)))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings["start_timeout"]
+        while not all(socket_path(self.settings, index).exists() for index in range(self.settings["count"])):
+            if loop.time() > deadline:
+                print("Front: not every worker came up in time, starting anyway")
+                return
+            await asyncio.sleep(0.1)
+
+    async def stop(self):
+        self._stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
+        for process in self.processes.values():
+            await process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+async def serve_front(cfg, command: list):
+    webhook, settings = webhook_settings(cfg), workers_settings(cfg)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    supervisor = WorkerSupervisor(command, settings)
+    await supervisor.start()
+    front = FrontServer(webhook, settings)
+    await front.start(webhook["listen"], webhook["port"])
+    print(f"Front listening on {webhook['listen']}:{webhook['port']}{front.path}, {settings['count']} workers")
+    try:
+        await stop.wait()
+    finally:
+        await front.stop()
+        await supervisor.stop()
+
+def run_front(cfg, main_script: str):
+    asyncio.run(serve_front(cfg, [sys.executable, main_script, "worker"]))
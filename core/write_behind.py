@@ -0,0 +1,97 @@
+import asyncio
+
+from core.config_loader import ADB, CFG
+
+DEFAULT_WRITE_BEHIND = {
+    "interval": 10,
+    "max_pending": 500
+}
+
+### --- Write-behind buffer for last_active / usage_count --- ###
+class WriteBehindBuffer:
+    def __init__(self):
+        self._last_active = {}  # user_id -> newest timestamp
+        self._usage = {}        # user_id -> pending usage_count increments
+        self._writing = ({}, {})  # the batch a flush is writing right now, still pending for readers
+        self._task = None
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    def _settings(self) -> dict:
+        settings = dict(DEFAULT_WRITE_BEHIND)
+        settings.update(CFG.get("WRITE_BEHIND", {}))
+        return settings
+
+    def overlay(self, user_id: int, row: dict | None) -> dict | None:
+        # a row read from the DB, plus what is still waiting here for that user
+        if row is None or row.get("usage_count") is None:
+            return row
+        usage = self._usage.get(user_id, 0) + self._writing[1].get(user_id, 0)
+        last_active = max(self._last_active.get(user_id, 0), self._writing[0].get(user_id, 0))
+        if not usage and last_active <= (row.get("last_active") or 0):
+            return row
+        return dict(row, usage_count=row["usage_count"] + usage, last_active=max(last_active, row.get("last_active") or 0))
+
+    def pending(self) -> int:
+        return len(self._last_active) + len(self._usage)
+
+    def _maybe_flush(self):
+        if self.pending() >= self._settings()["max_pending"] and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def touch(self, user_id: int, ts: int):
+        if ts > self._last_active.get(user_id, 0):
+            self._last_active[user_id] = ts
+        ADB.cache_user_fields(user_id, last_active=ts)
+        self._maybe_flush()
+
+    def add_usage(self, user_id: int, count: int = 1):
+        self._usage[user_id] = self._usage.get(user_id, 0) + count
+        ADB.cache_user_usage(user_id, count)
+        self._maybe_flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._last_active and not self._usage:
+                return
+            last_active, self._last_active = self._last_active, {}
+            usage, self._usage = self._usage, {}
+            self._writing = (last_active, usage)
+            try:
+                await ADB.apply_user_activity(last_active, usage)
+            except Exception as e:
+                self._writing = ({}, {})
+                print(f"Write-behind flush failed: {e}")
+                # put the entries back so the next flush retries them
+                for user_id, ts in last_active.items():
+                    self._last_active[user_id] = max(ts, self._last_active.get(user_id, 0))
+                for user_id, count in usage.items():
+                    self._usage[user_id] = self._usage.get(user_id, 0) + count
+                return
+            self._writing = ({}, {})
+            self.flushes += 1
+            self.flushed_rows += len(last_active) + len(usage)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._settings()["interval"])
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+WRITE_BEHIND = WriteBehindBuffer()
+ADB.set_pending_overlay(WRITE_BEHIND.overlay)
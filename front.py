@@ -0,0 +1,22 @@
+# Multi-worker entry point: receives Telegram's webhook POSTs and hands each
+# update to one of WORKERS.count bot processes (python main.py worker <i>),
+# chosen by the update's user, so a user's updates always land on the same worker.
+#
+# Bot-wide limits (RATE_LIMITS global_rate/global_burst, BROADCAST.global_rate,
+# NOTIFY.rate) keep their meaning: each worker enforces 1/count of them.
+#
+# Usage: python front.py   (WEBHOOK.url must point at WEBHOOK.listen:port/path)
+import json
+from pathlib import Path
+
+from core.workers import run_front
+
+# read directly: core.config_loader would open the DB in this process
+CONFIG_PATH = Path("config/config.json")
+
+def main():
+    cfg = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    run_front(cfg, str(Path(__file__).resolve().parent / "main.py"))
+
+if __name__ == "__main__":
+    main()
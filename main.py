@@ -1,11 +1,47 @@
+import sys
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler, ConversationHandler
+from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler, ConversationHandler, ChatMemberHandler, TypeHandler
 
-from core.config_loader import CFG, TEXTS
+from core import config_loader
+from core.config_loader import CFG, TEXTS, CONFIG_WATCHER
 from core.radargame_core import radargame_callbacks, new_radar_account, get_username, get_password, USERNAME, PASSWORD
 from core.utils import check_user
 from core.admin_system import show_all_users, broadcast, adminpanel, admin_userinfo, admin_callbacks
 from core.main_menu_handler import show_main_menu, main_menu_callbacks
+from core.http_client import start_http_client, close_http_client
+from core.membership import chat_member_updates
+from core.write_behind import WRITE_BEHIND
+from core.broadcast import BROADCASTS
+from core.config_archive import CONFIG_ARCHIVE
+from core.notifier import NOTIFIER, load_admin_panel
+from core.update_processor import PerUserUpdateProcessor, DEFAULT_CONCURRENT_UPDATES
+from core.metrics import instrument_handler, InstrumentedRequest, LOOP_LAG, METRICS_SERVER
+from core.flood_guard import FLOOD_GUARD
+from core.persistence import SQLitePersistence, persistence_settings
+from core.cache_bus import CACHE_BUS
+from core import workers
+from core.worker_server import run_worker
+
+def webhook_settings() -> dict:
+    # defaults live in core/workers.py, the front process reads them too
+    return workers.webhook_settings(CFG)
+
+def webhook_url(webhook: dict) -> str | None:
+    path = webhook["path"].strip("/")
+    return f"{webhook['url'].rstrip('/')}/{path}" if webhook["url"] else None
+
+DEFAULT_METRICS = {
+    "enabled": False,      # serve Prometheus text on http://listen:port/metrics
+    "listen": "127.0.0.1",
+    "port": 9464,
+    "loop_lag_interval": 0.5
+}
+
+def metrics_settings() -> dict:
+    settings = dict(DEFAULT_METRICS)
+    settings.update(CFG.get("METRICS", {}))
+    return settings
 
 async def help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_user(update, context):
@@ -39,38 +75,134 @@ async def global_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer(r"¯\_(ツ)_/¯")
         return
 
+# === Lifecycle ===
+async def on_startup(app: Application):
+    await start_http_client()
+    await load_admin_panel()
+    # global rate limits are split by the worker count, known from here on
+    FLOOD_GUARD.reset()
+    BROADCASTS.reset_buckets()
+    WRITE_BEHIND.start()
+    if workers.is_primary():
+        await BROADCASTS.resume_pending(app.bot)
+    CONFIG_ARCHIVE.start()
+    NOTIFIER.start(app.bot)
+    CONFIG_WATCHER.start()
+    metrics = metrics_settings()
+    LOOP_LAG.interval = metrics["loop_lag_interval"]
+    LOOP_LAG.start()
+    if metrics["enabled"]:
+        # one port per worker process
+        await METRICS_SERVER.start(metrics["listen"], metrics["port"] + (workers.current_worker() or 0))
+    if workers.current_worker() is not None:
+        await CACHE_BUS.start()
+        if workers.current_worker() == 0:
+            await register_webhook(app)
+
+async def register_webhook(app: Application):
+    # multi-worker mode: Telegram posts to the front (front.py), worker 0 tells it where
+    webhook = webhook_settings()
+    url = webhook_url(webhook)
+    if url:
+        await app.bot.set_webhook(url, secret_token=webhook["secret_token"] or None,
+                                  max_connections=webhook["max_connections"], allowed_updates=Update.ALL_TYPES)
+
+async def on_shutdown(app: Application):
+    await CACHE_BUS.stop()
+    await METRICS_SERVER.stop()
+    await LOOP_LAG.stop()
+    await CONFIG_WATCHER.stop()
+    await BROADCASTS.stop()
+    await CONFIG_ARCHIVE.stop()
+    await NOTIFIER.stop()
+    await WRITE_BEHIND.stop()
+    await close_http_client()
+    config_loader.ADB.close()
+
 # === Main Init ===
-def main():
-    token = CFG["BOT_TOKEN"]
-    app = Application.builder().token(token).build()
+def build_app(request=None) -> Application:
+    builder = Application.builder().token(CFG["BOT_TOKEN"]).post_init(on_startup).post_shutdown(on_shutdown)
+    if CFG.get("BOT_API_URL"):
+        # self-hosted Bot API server (or a local fake for scripts/bench_workers.py)
+        builder.base_url(CFG["BOT_API_URL"])
+    # different users run in parallel, each user's own updates stay in order
+    builder.concurrent_updates(PerUserUpdateProcessor(CFG.get("CONCURRENT_UPDATES", DEFAULT_CONCURRENT_UPDATES)))
+    persistence = persistence_settings()
+    if persistence["enabled"]:
+        # conversations and user_data survive restarts and deploys
+        builder.persistence(SQLitePersistence(persistence["update_interval"], persistence["max_cached"]))
+    if request is None:
+        # same transport PTB would build, plus per-method call counts and latency
+        builder.request(InstrumentedRequest(connection_pool_size=256)).get_updates_request(InstrumentedRequest())
+    else:
+        builder.request(request).get_updates_request(request)
+    app = builder.build()
+    if isinstance(app.persistence, SQLitePersistence):
+        app.persistence.attach(app)
+
+    # Rate limits, checked before any other group; rejected updates stop here
+    app.add_handler(TypeHandler(Update, FLOOD_GUARD.check), group=-1)
 
     # Commands
-    app.add_handler(CommandHandler(["start", "menu"], show_main_menu))
-    app.add_handler(CommandHandler("help", help))
-    app.add_handler(CommandHandler("dev", developer))
-    app.add_handler(CommandHandler("users", show_all_users))
-    app.add_handler(CommandHandler("user", admin_userinfo))
-    app.add_handler(CommandHandler("adminpanel", adminpanel))
-    app.add_handler(CommandHandler("broadcast", broadcast))
+    app.add_handler(CommandHandler(["start", "menu"], instrument_handler(show_main_menu)))
+    app.add_handler(CommandHandler("help", instrument_handler(help)))
+    app.add_handler(CommandHandler("dev", instrument_handler(developer)))
+    app.add_handler(CommandHandler("users", instrument_handler(show_all_users)))
+    app.add_handler(CommandHandler("user", instrument_handler(admin_userinfo)))
+    app.add_handler(CommandHandler("adminpanel", instrument_handler(adminpanel)))
+    app.add_handler(CommandHandler("broadcast", instrument_handler(broadcast)))
 
     # Callbacks
-    app.add_handler(CallbackQueryHandler(radargame_callbacks, pattern=r"^(server_|dns_|change_account|remove_account|set_active)"))
-    app.add_handler(CallbackQueryHandler(global_callbacks, pattern=r"^(emptycallback)$"))
-    app.add_handler(CallbackQueryHandler(main_menu_callbacks, pattern=r"^(backtomain|new_config|profile|help)"))
-    app.add_handler(CallbackQueryHandler(admin_callbacks, pattern=r"^(admin_|show_users:|toggle_|status_panel|reload_|adminpanel)"))
+    app.add_handler(CallbackQueryHandler(instrument_handler(radargame_callbacks), pattern=r"^(server_|dns_|change_account|remove_account|set_active)"))
+    app.add_handler(CallbackQueryHandler(instrument_handler(global_callbacks), pattern=r"^(emptycallback)$"))
+    app.add_handler(CallbackQueryHandler(instrument_handler(main_menu_callbacks), pattern=r"^(backtomain|new_config|profile|help)"))
+    app.add_handler(CallbackQueryHandler(instrument_handler(admin_callbacks), pattern=r"^(admin_|show_users:|toggle_|status_panel|reload_|adminpanel|bcast:)"))
 
     # Conversations
     app.add_handler(ConversationHandler(
-        entry_points=[CallbackQueryHandler(new_radar_account, pattern="^new_account$")],
+        entry_points=[CallbackQueryHandler(instrument_handler(new_radar_account), pattern="^new_account$")],
         states={
-            USERNAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_username)],
-            PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_password)],
+            USERNAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler(get_username))],
+            PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler(get_password))],
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", instrument_handler(cancel))],
+        name="new_radar_account",
+        persistent=persistence["enabled"]
     ))
 
+    # Force-join membership cache invalidation
+    app.add_handler(ChatMemberHandler(instrument_handler(chat_member_updates), ChatMemberHandler.ANY_CHAT_MEMBER))
+
+    return app
+
+def main():
+    if sys.argv[1:2] == ["worker"]:
+        # started by front.py, updates come from the front over a unix socket
+        index = int(sys.argv[2])
+        workers.set_worker(index, workers.workers_settings(CFG)["count"])
+        app = build_app()
+        print(f"Bot worker {index} started")
+        run_worker(app, workers.socket_path(workers.workers_settings(CFG), index))
+        return
+
+    app = build_app()
+    webhook = webhook_settings()
+
     print("Bot started")
-    app.run_polling(close_loop=False)
+    if webhook["enabled"]:
+        path = webhook["path"].strip("/")
+        app.run_webhook(
+            listen=webhook["listen"],
+            port=webhook["port"],
+            url_path=path,
+            webhook_url=webhook_url(webhook),
+            secret_token=webhook["secret_token"] or None,
+            max_connections=webhook["max_connections"],
+            close_loop=False,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        app.run_polling(close_loop=False, allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+# Per-query latency of the DB layer: connection-per-call vs long-lived connections.
+#
+# Usage: python scripts/bench_db.py [--rows 5000] [--queries 20000]
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.db import DB
+
+### --- The connection handling DB used before: new connection, default pragmas, every call --- ###
+class ConnectPerCallDB(DB):
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def close(self):
+        pass
+
+### --- Measurement --- ###
+def seed(db: DB, rows: int):
+    now = int(time.time())
+    for user_id in range(1, rows + 1):
+        db.upsert_user(user_id, f"user{user_id}", f"User {user_id}", f"hash{user_id}", now)
+        db.add_radargame_account(user_id, f"acc{user_id}@example.com", "secret")
+
+def measure(func, count: int) -> list:
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def summary(samples: list) -> str:
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return f"mean {statistics.fmean(samples):8.1f}us  p50 {p(0.50):8.1f}us  p99 {p(0.99):8.1f}us"
+
+def run(db_cls, path: str, rows: int, queries: int):
+    db = db_cls(path, user_cache_size=1)
+    seed(db, rows)
+    results = {
+        "read  get_active_radargame_account": measure(lambda i: db.get_active_radargame_account(i % rows + 1), queries),
+        "read  stats_for_user": measure(lambda i: db.stats_for_user(i % rows + 1), queries),
+        "write set_ban": measure(lambda i: db.set_ban(i % rows + 1, i % 2 == 0), queries // 4),
+        "write set_active_radargame": measure(lambda i: db.set_active_radargame(i % rows + 1, f"acc{i % rows + 1}@example.com"), queries // 4),
+    }
+    db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run(ConnectPerCallDB, os.path.join(tmp, "before.db"), args.rows, args.queries)
+        after = run(DB, os.path.join(tmp, "after.db"), args.rows, args.queries)
+
+    for name in before:
+        print(name)
+        print(f"  before: {summary(before[name])}")
+        print(f"  after:  {summary(after[name])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# End-to-end benchmark: synthetic updates through the real handler graph.
+#
+# Telegram is replaced by the recording FakeBotRequest and RadarGame by the
+# local stub from bench_updates.py (configurable latency and error rate). Each
+# scenario runs on a fresh database and reports throughput, p50/p95/p99 update
+# latency and Bot API calls per update:
+#
+# - check_user  registered users sending /help (check_user + one reply)
+# - new_config  new_config -> server -> DNS for users with one saved account
+# - paging      change_account, then "next" until the last page (23 accounts each)
+# - broadcast   one /broadcast to every user; latency is the time until each
+#               recipient's copyMessage, so it includes the broadcast rate limits
+#
+# Results are written to bench-results/e2e-<time>.json; --compare prints the
+# change against an earlier file.
+#
+# Usage: python scripts/bench_e2e.py [--users 100] [--api-latency 0.05] [--api-error-rate 0] [--compare bench-results/e2e-....json]
+import argparse
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from telegram import Update
+
+from bench_updates import FakeBotRequest, start_fake_api, prepare_workdir, message, callback, percentile
+
+SCENARIOS = ("check_user", "new_config", "paging", "broadcast")
+OWNER_ID = 123456789  # OWNERS in config-example.json
+FIRST_UID = 1_000_000
+PAGING_ACCOUNTS = 23
+
+### --- Scenario setup (not measured) --- ###
+async def register_users(users: int):
+    from core.config_loader import ADB
+    from core.utils import gen_hash
+
+    now = int(time.time())
+    for uid in range(FIRST_UID, FIRST_UID + users):
+        await ADB.upsert_user(uid, f"user{uid}", f"User{uid}", gen_hash(12), now)
+
+async def add_accounts(users: int, per_user: int):
+    from core.config_loader import ADB
+
+    for uid in range(FIRST_UID, FIRST_UID + users):
+        for n in range(per_user):
+            await ADB.add_radargame_account(uid, f"user{uid}.{n}@example.com", "password")
+
+def next_page(request: FakeBotRequest, uid: int):
+    # the "next" button of the account list last shown to this user
+    for row in (request.markups.get(uid) or {}).get("inline_keyboard", []):
+        for button in row:
+            data = button.get("callback_data", "")
+            if data.startswith("change_account:") and ":n:" in data:
+                return data
+    return None
+
+### --- Scenario drivers --- ###
+async def drive(app, processor, flows: dict) -> list:
+    # flows: uid -> async iterator of update dicts; each user's next update is
+    # only produced after the previous one was handled, users run in parallel
+    latencies = []
+
+    async def run_user(flow):
+        async for data in flow:
+            update = Update.de_json(data, app.bot)
+            submitted = time.perf_counter()
+            await processor.process_update(update, app.process_update(update))
+            latencies.append(time.perf_counter() - submitted)
+
+    await asyncio.gather(*(run_user(flow) for flow in flows.values()))
+    return latencies
+
+async def static_flow(updates: list):
+    for data in updates:
+        yield data
+
+async def paging_flow(request: FakeBotRequest, uid: int):
+    yield callback(uid, "change_account")
+    while (data := next_page(request, uid)) is not None:
+        yield callback(uid, data)
+
+async def run_scenario(name: str, app, processor, request: FakeBotRequest, users: int) -> dict:
+    from core.config_loader import ADB
+
+    uids = range(FIRST_UID, FIRST_UID + users)
+    await register_users(users)
+    if name == "check_user":
+        flows = {uid: static_flow([message(uid, "/help") for _ in range(3)]) for uid in uids}
+    elif name == "new_config":
+        await add_accounts(users, 1)
+        flows = {uid: static_flow([callback(uid, "new_config"), callback(uid, "server_1"), callback(uid, "dns_0")]) for uid in uids}
+    elif name == "paging":
+        await add_accounts(users, PAGING_ACCOUNTS)
+        flows = {uid: paging_flow(request, uid) for uid in uids}
+
+    calls_before = sum(request.calls.values())
+    sent_before = len(request.sent)
+    started = time.perf_counter()
+    if name == "broadcast":
+        origin = message(OWNER_ID, "/broadcast")
+        origin["message"]["reply_to_message"] = {"message_id": 1, "date": int(time.time()), "chat": {"id": OWNER_ID, "type": "private"}, "text": "news"}
+        await drive(app, processor, {OWNER_ID: static_flow([origin])})
+        while (job := await ADB.get_broadcast_job(1)) is None or job["status"] != "done":
+            await asyncio.sleep(0.05)
+        latencies = [at - started for method, at in request.sent[sent_before:] if method == "copyMessage"]
+        updates = len(latencies)  # one delivery per recipient
+    else:
+        latencies = await drive(app, processor, flows)
+        updates = len(latencies)
+    elapsed = time.perf_counter() - started
+
+    latencies = [value * 1000 for value in latencies]
+    return {
+        "updates": updates,
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(updates / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "bot_calls_per_update": round((sum(request.calls.values()) - calls_before) / max(updates, 1), 2),
+        "configs": request.calls.get("sendDocument", 0),
+    }
+
+async def bench_one(name: str, args) -> dict:
+    # fresh stub, config and database per scenario; the imported core modules
+    # keep their state between scenarios, so each one runs in its own process
+    api = await start_fake_api(args.api_latency, args.api_error_rate)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-e2e-"))
+    prepare_workdir(workdir, api.sockets[0].getsockname()[1])
+
+    from main import build_app
+    from core.update_processor import PerUserUpdateProcessor
+
+    request = FakeBotRequest(args.bot_latency)
+    app = build_app(request=request)
+    await app.initialize()
+    await app.post_init(app)
+    try:
+        return await run_scenario(name, app, PerUserUpdateProcessor(args.concurrency), request, args.users)
+    finally:
+        await app.shutdown()
+        await app.post_shutdown(app)
+        api.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+### --- Results --- ###
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_results(results: dict, baseline: dict | None):
+    print(f"{'scenario':<12}{'updates':>8}{'upd/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/upd':>11}")
+    for name, result in results.items():
+        line = (f"{name:<12}{result['updates']:>8}{result['throughput']:>9.1f}{result['p50_ms']:>9.1f}"
+                f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['bot_calls_per_update']:>11.2f}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            change = lambda key: (result[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+            line += f"   vs baseline: upd/s {change('throughput'):+.0f}%  p95 {change('p95_ms'):+.0f}%  calls/upd {change('bot_calls_per_update'):+.0f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark: synthetic updates through the real handler graph.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per RadarGame call")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="share of RadarGame calls that fail")
+    parser.add_argument("--bot-latency", type=float, default=0.01, help="seconds per Bot API call")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", type=Path, default=None, help="result file (default bench-results/e2e-<time>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier result file to compare against")
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)  # child process mode
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(asyncio.run(bench_one(args.scenario, args))))
+        return
+
+    results = {}
+    for name in args.scenarios:
+        child = [sys.executable, __file__, "--scenario", name, "--users", str(args.users), "--concurrency", str(args.concurrency),
+                 "--api-latency", str(args.api_latency), "--api-error-rate", str(args.api_error_rate), "--bot-latency", str(args.bot_latency)]
+        output = subprocess.run(child, stdout=subprocess.PIPE, text=True, check=True).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+
+    baseline = json.loads(args.compare.read_text(encoding="utf-8"))["results"] if args.compare else None
+    print(f"{args.users} users, RadarGame {args.api_latency * 1000:.0f}ms / {args.api_error_rate:.0%} errors, "
+          f"Bot API {args.bot_latency * 1000:.0f}ms, concurrency {args.concurrency}")
+    print_results(results, baseline)
+
+    output = args.output or ROOT / "bench-results" / f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    settings = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "scenario")}
+    output.write_text(json.dumps({"revision": git_revision(), "time": int(time.time()), "settings": settings, "results": results}, indent=2), encoding="utf-8")
+    print(f"saved {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# Load test of update processing: a burst of users adding an account and getting a config.
+#
+# The Bot API and the RadarGame API are both faked locally; RadarGame answers
+# after --api-latency seconds, so a slow login is visible. Every run drives the
+# real handler graph from main.build_app() and only swaps the update processor:
+# concurrency 1 is PTB's default (one update at a time), anything else is
+# PerUserUpdateProcessor.
+#
+# Usage: python scripts/bench_updates.py [--users 50] [--api-latency 0.3] [--concurrency 1 64]
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from telegram import Update
+from telegram.ext import SimpleUpdateProcessor
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 999, "is_bot": True, "first_name": "Bot", "username": "bench_bot"}
+TRUE_METHODS = {"answerCallbackQuery", "setMessageReaction", "deleteMessage", "sendChatAction", "setWebhook", "deleteWebhook"}
+SERVERS = [{"id": 1, "location": "DE", "loadPercentage": 50}, {"id": 2, "location": "NL", "loadPercentage": 10}]
+ACCOUNT = {"privateKey": "k", "addresses": "10.0.0.2/32", "mtu": 1280, "endpointPublicKey": "p", "presharedKey": "s",
+           "endpoint": "1.2.3.4:51820", "allowedIPs": "0.0.0.0/0", "persistentKeepalive": 25}
+
+### --- Fake Bot API --- ###
+class FakeBotRequest(BaseRequest):
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self.sent = []     # (method, perf_counter) of every call, in order
+        self.markups = {}  # chat_id -> reply_markup of the last message sent/edited there
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return 5
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.sent.append((name, time.perf_counter()))
+        if "reply_markup" in params and "chat_id" in params:
+            self.markups[int(params["chat_id"])] = params["reply_markup"]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if name == "getMe":
+            result = BOT_USER
+        elif name == "getChatMember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 1)), "is_bot": False, "first_name": "u"}}
+        elif name in TRUE_METHODS:
+            result = True
+        else:
+            chat_id = int(params.get("chat_id", 1))
+            result = {"message_id": next(self._message_ids), "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+### --- Fake RadarGame API --- ###
+async def start_fake_api(latency: float, error_rate: float = 0.0, seed: int = 1):
+    # error_rate: share of calls answered with HTTP 500 / isSuccess=false
+    rng = random.Random(seed)
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                path = lines[0].split(" ")[1].split("?")[0]
+                length = next((int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:")), 0)
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(latency)
+                if rng.random() < error_rate:
+                    body = json.dumps({"isSuccess": False, "message": "internal error"}).encode()
+                    writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+                    await writer.drain()
+                    continue
+                if path.endswith("/auth/login"):
+                    result = {"accessToken": "token"}
+                elif path.endswith("/user/servers"):
+                    result = SERVERS
+                else:
+                    result = ACCOUNT
+                body = json.dumps({"isSuccess": True, "result": result}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+### --- Synthetic updates --- ###
+_update_ids = itertools.count(1)
+
+def user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"User{uid}", "username": f"user{uid}"}
+
+def message(uid: int, text: str) -> dict:
+    data = {"message_id": next(_update_ids), "date": int(time.time()), "chat": {"id": uid, "type": "private"}, "from": user(uid), "text": text}
+    if text.startswith("/"):
+        data["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": next(_update_ids), "message": data}
+
+def callback(uid: int, data: str) -> dict:
+    origin = {"message_id": next(_update_ids), "date": int(time.time()), "chat": {"id": uid, "type": "private"}, "from": BOT_USER, "text": "-"}
+    return {"update_id": next(_update_ids), "callback_query": {"id": str(next(_update_ids)), "from": user(uid), "chat_instance": "bench", "data": data, "message": origin}}
+
+def user_flow(uid: int) -> list:
+    # add an account (login), then fetch a config (servers + account)
+    return [
+        message(uid, "/start"),
+        callback(uid, "new_account"),
+        message(uid, f"user{uid}@example.com"),
+        message(uid, "password"),
+        callback(uid, "new_config"),
+        callback(uid, "server_1"),
+        callback(uid, "dns_0"),
+    ]
+
+### --- Benchmark --- ###
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+async def run_burst(app, processor, first_uid: int, users: int) -> dict:
+    flows = [user_flow(uid) for uid in range(first_uid, first_uid + users)]
+    # round-robin arrival: step 1 of every user, then step 2, ...
+    arrivals = [flow[step] for step in range(len(flows[0])) for flow in flows]
+    latencies = []
+    completed = {}
+
+    async def handle(data: dict):
+        update = Update.de_json(data, app.bot)
+        submitted = time.perf_counter()
+        await processor.process_update(update, app.process_update(update))
+        latencies.append(time.perf_counter() - submitted)
+        completed.setdefault(update.effective_user.id, []).append(update.update_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handle(data) for data in arrivals))
+    elapsed = time.perf_counter() - started
+
+    in_order = all(ids == sorted(ids) for ids in completed.values())
+    return {"elapsed": elapsed, "updates": len(arrivals), "latencies": latencies, "in_order": in_order}
+
+def prepare_workdir(workdir: Path, api_port: int):
+    # a throwaway config/ and database, the real ones are never touched
+    (workdir / "config").mkdir()
+    for name in ("texts.json", "custom_dns.json"):
+        shutil.copy(ROOT / "config" / name, workdir / "config" / name)
+    cfg = json.loads((ROOT / "config" / "config-example.json").read_text(encoding="utf-8"))
+    cfg.update(DB_PATH=str(workdir / "bench.db"), RADARGAME_API_BASE=f"http://127.0.0.1:{api_port}/v1", REQUIRED_CHATS=[])
+    cfg["NOTIFY"] = dict(cfg.get("NOTIFY", {}), digest_interval=3600)
+    # measure handler capacity, not the flood guard in front of it
+    cfg["RATE_LIMITS"] = dict(cfg.get("RATE_LIMITS", {}), enabled=False)
+    (workdir / "config" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    os.chdir(workdir)
+
+async def bench(args):
+    api = await start_fake_api(args.api_latency)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-updates-"))
+    prepare_workdir(workdir, api.sockets[0].getsockname()[1])
+
+    from main import build_app
+    from core.update_processor import PerUserUpdateProcessor
+
+    request = FakeBotRequest(args.bot_latency)
+    app = build_app(request=request)
+    await app.initialize()
+    await app.post_init(app)
+    print(f"{args.users} users x {len(user_flow(0))} updates, RadarGame latency {args.api_latency * 1000:.0f}ms, Bot API latency {args.bot_latency * 1000:.0f}ms")
+    try:
+        first_uid = 1_000_000
+        for concurrency in args.concurrency:
+            processor = SimpleUpdateProcessor(1) if concurrency == 1 else PerUserUpdateProcessor(concurrency)
+            documents = request.calls.get("sendDocument", 0)
+            result = await run_burst(app, processor, first_uid, args.users)
+            first_uid += args.users
+            latencies = [value * 1000 for value in result["latencies"]]
+            print(f"concurrency {concurrency:>4}: {result['elapsed']:7.2f}s  {result['updates'] / result['elapsed']:8.1f} updates/s  "
+                  f"p50 {percentile(latencies, 0.50):8.1f}ms  p95 {percentile(latencies, 0.95):8.1f}ms  "
+                  f"configs {request.calls.get('sendDocument', 0) - documents}/{args.users}  per-user order {'ok' if result['in_order'] else 'BROKEN'}")
+    finally:
+        await app.shutdown()
+        await app.post_shutdown(app)
+        api.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of update processing: a burst of users adding an account and getting a config.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--api-latency", type=float, default=0.3, help="seconds per RadarGame call")
+    parser.add_argument("--bot-latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 64])
+    asyncio.run(bench(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# Multi-worker benchmark: updates per second through front.py with 1, 2, 4... workers.
+#
+# Each run starts front.py (which spawns the workers) on a fresh database, with
+# the Bot API faked over HTTP (BOT_API_URL) and RadarGame by the stub from
+# bench_updates.py. Every user posts the bench_updates.py flow (/start, add an
+# account, get a config) to the webhook, one update after the other as Telegram
+# would; a run ends when every user has received its config file, which also
+# shows that each user's updates were handled in order.
+#
+# Scaling needs a core per worker (plus one for the front and this script);
+# the CPU count is printed next to the results.
+#
+# Usage: python scripts/bench_workers.py [--users 200] [--workers 1 2 4] [--api-latency 0.05]
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from bench_updates import BOT_USER, TRUE_METHODS, start_fake_api, prepare_workdir, user_flow
+
+FIRST_UID = 1_000_000
+SECRET = "bench"
+
+### --- Fake Bot API over HTTP (the workers are separate processes) --- ###
+class FakeBotApi:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = {}
+        self.configs = 0
+        self.done = asyncio.Event()
+        self.expected = 0
+        self._message_id = 0
+
+    def _result(self, name: str, params: dict):
+        if name == "getMe":
+            return BOT_USER
+        if name == "getChatMember":
+            return {"status": "member", "user": {"id": int(params.get("user_id", 1)), "is_bot": False, "first_name": "u"}}
+        if name in TRUE_METHODS:
+            return True
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": int(time.time()), "chat": {"id": int(params.get("chat_id", 1)), "type": "private"}}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                name = head[0].split(" ")[1].split("?")[0].rsplit("/", 1)[-1]
+                headers = {key.strip().lower(): value.strip() for key, _, value in (line.partition(":") for line in head[1:] if line)}
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                # sendDocument is multipart, only its count matters here
+                params = dict(parse_qsl(body.decode("latin-1"))) if "urlencoded" in headers.get("content-type", "") else {}
+                self.calls[name] = self.calls.get(name, 0) + 1
+                if name == "sendDocument":
+                    self.configs += 1
+                    if self.configs >= self.expected:
+                        self.done.set()
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                payload = json.dumps({"ok": True, "result": self._result(name, params)}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(payload), payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+### --- One run: front + N workers --- ###
+def configure(workdir: Path, workers: int, front_port: int, bot_api_port: int):
+    path = workdir / "config" / "config.json"
+    cfg = json.loads(path.read_text(encoding="utf-8"))
+    cfg["BOT_API_URL"] = f"http://127.0.0.1:{bot_api_port}/bot"
+    cfg["WEBHOOK"] = dict(cfg.get("WEBHOOK", {}), listen="127.0.0.1", port=front_port, path="telegram", url="", secret_token=SECRET)
+    cfg["WORKERS"] = dict(cfg.get("WORKERS", {}), count=workers, socket_dir=str(workdir / "run"))
+    cfg["CONFIG_WATCH"] = {"interval": 0}
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_ready(workdir: Path, workers: int, port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all((workdir / "run" / f"worker-{i}.sock").exists() for i in range(workers)):
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                return
+            except OSError:
+                pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("front / workers did not start")
+
+async def post_updates(port: int, users: int, connections: int) -> int:
+    # each user's updates are posted in order, different users in parallel
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=httpx.Limits(max_connections=connections),
+                                 headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}, timeout=30) as client:
+        async def run_user(uid: int) -> int:
+            rejected = 0
+            for update in user_flow(uid):
+                while (await client.post("/telegram", content=json.dumps(update))).status_code != 200:
+                    rejected += 1  # 503: retried like Telegram would
+                    await asyncio.sleep(0.1)
+            return rejected
+        return sum(await asyncio.gather(*(run_user(uid) for uid in range(FIRST_UID, FIRST_UID + users))))
+
+async def bench_one(workers: int, args) -> dict:
+    api = await start_fake_api(args.api_latency)
+    bot_api = FakeBotApi(args.bot_latency)
+    bot_server = await asyncio.start_server(bot_api.handle, "127.0.0.1", 0)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-workers-"))
+    prepare_workdir(workdir, api.sockets[0].getsockname()[1])
+    front_port = free_port()
+    configure(workdir, workers, front_port, bot_server.sockets[0].getsockname()[1])
+
+    front = subprocess.Popen([sys.executable, str(ROOT / "front.py")], cwd=workdir, stdout=subprocess.DEVNULL)
+    try:
+        await wait_ready(workdir, workers, front_port)
+        bot_api.expected = args.users
+        started = time.perf_counter()
+        rejected = await post_updates(front_port, args.users, args.connections)
+        queued = time.perf_counter() - started
+        await asyncio.wait_for(bot_api.done.wait(), args.timeout)
+        elapsed = time.perf_counter() - started
+    finally:
+        front.send_signal(signal.SIGTERM)
+        await asyncio.to_thread(front.wait)
+        bot_server.close()
+        api.close()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    updates = args.users * len(user_flow(FIRST_UID))
+    return {"workers": workers, "updates": updates, "elapsed_s": round(elapsed, 3), "queued_s": round(queued, 3),
+            "throughput": round(updates / elapsed, 1), "rejected": rejected, "bot_calls": sum(bot_api.calls.values())}
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker benchmark: updates per second through front.py with 1, 2, 4... workers.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per RadarGame call")
+    parser.add_argument("--bot-latency", type=float, default=0.01, help="seconds per Bot API call")
+    parser.add_argument("--connections", type=int, default=40, help="parallel webhook connections, like WEBHOOK.max_connections")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for every config")
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {len(user_flow(FIRST_UID))} updates, RadarGame {args.api_latency * 1000:.0f}ms, "
+          f"Bot API {args.bot_latency * 1000:.0f}ms, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8}{'updates':>9}{'seconds':>9}{'upd/s':>9}{'speedup':>9}{'503s':>6}")
+    base = None
+    for count in args.workers:
+        result = asyncio.run(bench_one(count, args))
+        base = base or result["throughput"]
+        print(f"{count:>8}{result['updates']:>9}{result['elapsed_s']:>9.2f}{result['throughput']:>9.1f}"
+              f"{result['throughput'] / base:>8.2f}x{result['rejected']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Assert that the hot queries are answered from indexes, not full table scans.
+#
+# Usage: python scripts/check_query_plans.py   (exit code 1 on any failure)
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.db import DB
+
+### --- Hot queries: (description, sql, params, index the plan must mention) --- ###
+HOT_QUERIES = [
+    ("get_user", "SELECT * FROM users WHERE user_id=?", (1,), "INTEGER PRIMARY KEY"),
+    ("find_user_by_any @username", "SELECT * FROM users WHERE username=?", ("name",), "idx_users_username"),
+    ("find_user_by_any hash", "SELECT * FROM users WHERE user_hash=?", ("hash",), "sqlite_autoindex_users_1"),
+    ("count_users", "SELECT value FROM stats WHERE key = 'total_users'", (), "USING PRIMARY KEY"),
+    ("status_panel history", "SELECT * FROM daily_stats WHERE day > date('now', 'localtime', ?) ORDER BY day DESC", ("-7 days",), "SEARCH daily_stats USING PRIMARY KEY"),
+    ("broadcast recipients", "SELECT user_id FROM users WHERE user_id > ? AND banned=0 AND blocked=0 ORDER BY user_id LIMIT ?", (0, 100), "idx_users_banned"),
+    ("get_active_radargame_account", "SELECT * FROM radargame WHERE user_id = ? AND is_active = 1 LIMIT 1", (1,), "idx_radargame_user_id"),
+    ("show_all_users first page", "SELECT * FROM users ORDER BY created_at ASC, user_id ASC LIMIT ?", (20,), "idx_users_created"),
+    ("show_all_users next page", "SELECT * FROM users WHERE (created_at, user_id) > (?, ?) ORDER BY created_at ASC, user_id ASC LIMIT ?", (0, 0, 20), "SEARCH users USING INDEX idx_users_created"),
+    ("show_all_users previous page", "SELECT * FROM users WHERE (created_at, user_id) < (?, ?) ORDER BY created_at DESC, user_id DESC LIMIT ?", (0, 0, 20), "SEARCH users USING INDEX idx_users_created"),
+    ("change_radar_account next page", "SELECT * FROM radargame WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?", (1, 0, 5), "idx_radargame_user_id"),
+    ("change_radar_account previous page", "SELECT * FROM radargame WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 0, 5), "idx_radargame_user_id"),
+    ("get_user_radargame_accounts", "SELECT * FROM radargame WHERE user_id = ?", (1,), "idx_radargame_user_id"),
+    ("delete_radargame_account", "SELECT id FROM radargame WHERE user_id=? AND username=?", (1, "a"), "idx_radargame_user_username"),
+    ("set_active_radargame", "SELECT id FROM radargame WHERE user_id = ? AND username = ?", (1, "a"), "idx_radargame_user_username"),
+    ("persistence refresh_user_data", "SELECT key, value FROM persisted_data WHERE scope = ? AND owner_id = ?", ("user", 1), "SEARCH persisted_data USING PRIMARY KEY"),
+    ("persistence get_conversations", "SELECT conv_key, state FROM conversations WHERE name = ?", ("new_radar_account",), "SEARCH conversations USING PRIMARY KEY"),
+    ("cache bus poll", "SELECT id, kind, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id LIMIT ?", (0, 500), "SEARCH cache_invalidations USING INTEGER PRIMARY KEY"),
+]
+
+### --- Check --- ###
+def query_plan(conn, sql: str, params) -> str:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return " | ".join(row[3] for row in rows)
+
+def main() -> int:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DB(os.path.join(tmp, "plans.db"))
+        conn = db._connect()
+        for name, sql, params, index in HOT_QUERIES:
+            plan = query_plan(conn, sql, params)
+            ok = index in plan
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: {plan}")
+            failures += not ok
+        db.close()
+    print(f"{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use their index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Check that front.py routes every update to the worker owning the user it is about.
+#
+# Usage: python scripts/check_routing.py   (exit code 1 on any failure)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.workers import route_key, worker_for
+
+BOT_ID = 999
+ADMIN = {"id": 111, "is_bot": False, "first_name": "Admin"}
+MEMBER = {"id": 222, "is_bot": False, "first_name": "Member"}
+BOT = {"id": BOT_ID, "is_bot": True, "first_name": "Bot"}
+CHANNEL = {"id": -100123, "type": "channel"}
+PRIVATE = {"id": 222, "type": "private"}
+
+def member_update(field: str, actor: dict, member: dict, status: str) -> dict:
+    return {"update_id": 1, field: {"chat": CHANNEL, "from": actor, "date": 0,
+                                    "old_chat_member": {"user": member, "status": "member"},
+                                    "new_chat_member": {"user": member, "status": status}}}
+
+### --- Cases: (description, update, expected route key) --- ###
+CASES = [
+    ("message", {"update_id": 1, "message": {"message_id": 1, "chat": PRIVATE, "from": MEMBER, "text": "/start"}}, 222),
+    ("callback_query", {"update_id": 1, "callback_query": {"id": "1", "from": MEMBER, "message": {"chat": {"id": 5}}}}, 222),
+    ("poll_answer", {"update_id": 1, "poll_answer": {"poll_id": "1", "user": MEMBER, "option_ids": [0]}}, 222),
+    ("chat_member kicked by an admin", member_update("chat_member", ADMIN, MEMBER, "kicked"), 222),
+    ("chat_member left", member_update("chat_member", MEMBER, MEMBER, "left"), 222),
+    ("my_chat_member (bot removed)", member_update("my_chat_member", ADMIN, BOT, "left"), BOT_ID),
+    ("channel_post", {"update_id": 1, "channel_post": {"message_id": 1, "chat": CHANNEL, "text": "x"}}, CHANNEL["id"]),
+    ("no user or chat", {"update_id": 1}, 0),
+]
+
+### --- Check --- ###
+def main() -> int:
+    failures = 0
+    for name, update, expected in CASES:
+        key = route_key(update)
+        ok = key == expected and worker_for(update, 4) == expected % 4
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: key={key} expected={expected}")
+        failures += not ok
+    print(f"{len(CASES) - failures}/{len(CASES)} updates routed to their user's worker")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
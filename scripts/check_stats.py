@@ -0,0 +1,37 @@
+# Compare the trigger-maintained counters in `stats` with full table scans.
+#
+# Usage: python scripts/check_stats.py [path/to/bot.db]   (exit code 1 on any drift)
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+### --- Counters: key -> query that recomputes it from scratch --- ###
+RECOUNTS = {
+    "total_users": "SELECT COUNT(*) FROM users",
+    "banned_users": "SELECT COUNT(*) FROM users WHERE banned=1",
+    "configs_generated": "SELECT COALESCE(SUM(usage_count), 0) FROM users",
+    "total_radargame": "SELECT COUNT(*) FROM radargame",
+}
+
+### --- Check --- ###
+def main() -> int:
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        from core.config_loader import CFG
+        path = CFG["DB_PATH"]
+    conn = sqlite3.connect(path)
+    stored = dict(conn.execute("SELECT key, value FROM stats"))
+    failures = 0
+    for key, sql in RECOUNTS.items():
+        actual = conn.execute(sql).fetchone()[0]
+        ok = stored.get(key) == actual
+        print(f"{'ok  ' if ok else 'FAIL'} {key}: stats={stored.get(key)} scan={actual}")
+        failures += not ok
+    conn.close()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())